@@ -2,20 +2,31 @@ from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from typing import Union
+from config import settings
 # JWT settings
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. Hashes made with a different cost than BCRYPT_ROUNDS are
+# reported by verify_and_update so login can transparently rehash them
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password, hashed_password):
+    # Returns (matches, new_hash); new_hash is None unless the hash needs upgrading
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def token_claims(user):
+    # The user id and token version let get_current_user skip the users table;
+    # typ keeps refresh tokens, signed with the same key, from passing as access tokens
+    return {"typ": "access", "sub": user.email, "uid": user.id, "ver": user.token_version or 0}
+
 def create_access_token(data: dict, expires_delta: Union[timedelta, None]):
     to_encode = data.copy()
     if expires_delta:
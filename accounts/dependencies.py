@@ -0,0 +1,109 @@
+import threading
+from datetime import datetime, timezone
+from cachetools import TTLCache
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from accounts import auth
+from accounts.models import User
+from accounts.schemas import CurrentUser
+from database import get_read_db
+from config import settings
+
+# OAuth2 scheme
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+# token -> decoded payload, so a token is only verified once per TTL
+_token_cache = TTLCache(maxsize=settings.auth_token_cache_size, ttl=settings.auth_token_cache_ttl)
+# user id -> CurrentUser, so most requests never touch the users table
+_user_cache = TTLCache(maxsize=settings.auth_user_cache_size, ttl=settings.auth_user_cache_ttl)
+_lock = threading.Lock()
+
+
+def decode_token(token: str):
+    with _lock:
+        payload = _token_cache.get(token)
+
+    if payload is None:
+        try:
+            payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+        except JWTError:
+            return None
+        with _lock:
+            _token_cache[token] = payload
+    # A cached payload may outlive the token itself
+    elif payload.get("exp", 0) < datetime.now(timezone.utc).timestamp():
+        return None
+
+    return payload
+
+
+def invalidate_user(user_id: int):
+    """Forgets the cached user, e.g. after a password change bumped its token version."""
+    with _lock:
+        _user_cache.pop(user_id, None)
+
+
+async def load_user(db: AsyncSession, condition):
+    db_user = await db.scalar(select(User).where(condition))
+    # Hand the connection back; the route may go on to wait for the LLM
+    await db.commit()
+    return CurrentUser.model_validate(db_user) if db_user else None
+
+
+async def get_user_for_token(db: AsyncSession, user_id: int, token_version: int):
+    """
+    The cached user if the token version still matches, else None. On a version
+    mismatch the user is re-read: another worker may have changed the password.
+    """
+    with _lock:
+        user = _user_cache.get(user_id)
+    if user is None or user.token_version != token_version:
+        user = await load_user(db, User.id == user_id)
+    if user is None or user.token_version != token_version:
+        return None
+
+    with _lock:
+        _user_cache[user.id] = user
+    return user
+
+
+# Dependency to get current user from JWT
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_read_db)) -> CurrentUser:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    payload = decode_token(token)
+    # Access tokens issued before typ was added carry none
+    if payload is None or payload.get("typ", "access") != "access":
+        raise credentials_exception
+
+    user_id = payload.get("uid")
+    email = payload.get("sub")
+
+    if user_id is not None:
+        user = await get_user_for_token(db, user_id, payload.get("ver", 0))
+        if user is None:
+            raise credentials_exception
+    elif email is not None:
+        # Tokens issued before user ids were added to the claims
+        user = await load_user(db, User.email == email)
+        if user is None:
+            raise credentials_exception
+    else:
+        raise credentials_exception
+
+    with _lock:
+        _user_cache[user.id] = user
+    return user
+
+
+# Dependency for maintenance endpoints
+async def get_admin_user(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    if current_user.email not in settings.admin_emails:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
+    return current_user
@@ -0,0 +1,64 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from accounts import auth
+from config import settings
+import metrics
+
+# bcrypt is pure CPU for ~100-300 ms per call. Running it in a dedicated process
+# pool keeps it off the event loop and out of the threadpool other requests use.
+_pool = None
+_in_flight = 0
+_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        # spawn rather than fork: the server process has threads running
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.password_hash_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_in_pool(fn, *args):
+    """
+    Runs fn in the hashing pool. When the pool already has its queue limit of
+    jobs in flight the request is shed right away with a 503 instead of waiting.
+    """
+    global _in_flight
+    with _lock:
+        if _in_flight >= settings.password_hash_queue_limit:
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        _in_flight += 1
+
+    try:
+        async with metrics.atimed("bcrypt"):
+            return await asyncio.get_running_loop().run_in_executor(get_pool(), fn, *args)
+    finally:
+        with _lock:
+            _in_flight -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await run_in_pool(auth.get_password_hash, password)
+
+
+async def verify_password(password: str, hashed_password: str):
+    """Returns (matches, new_hash); new_hash is set when the stored hash used another cost."""
+    return await run_in_pool(auth.verify_and_update_password, password, hashed_password)
@@ -1,41 +1,32 @@
 from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from accounts.database import SessionLocal, engine
-from accounts import models, schemas, auth
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import engine
+from accounts import models, schemas, auth, hashing
 from accounts.models import User
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from accounts.schemas import TokenData
+from accounts.dependencies import get_current_user
+from database import get_db
 from datetime import timedelta
 app = FastAPI()
 
 models.Base.metadata.create_all(bind=engine)
-# OAuth2 scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-# Dependency for database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 # Signup API
 @app.post("/signup", response_model=schemas.UserResponse)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    hashed_password = auth.get_password_hash(user.password)
-    db_user = User(email=user.email, hashed_password=hashed_password,first_name=user.first_name,last_name=user.last_name,address=user.address,phone_number =user.phone_number,education=user.education)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    # bcrypt runs in the hashing pool, off the event loop
+    hashed_password = await hashing.hash_password(user.password)
+    db_user = User(email=user.email, password=hashed_password,first_name=user.first_name,last_name=user.last_name,address=user.address,phone_number =user.phone_number,education=user.education)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     return db_user
 
 # Login API
 @app.post("/login", response_model=schemas.Token)
-def login_for_access_token(form_data: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.email).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: schemas.UserLogin, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.email == form_data.email))
+    verified, _ = await hashing.verify_password(form_data.password, user.password) if user else (False, None)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -46,36 +37,13 @@ def login_for_access_token(form_data: schemas.UserLogin, db: Session = Depends(g
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     
     # Pass expires_delta as an argument
-    access_token = auth.create_access_token(data={"sub": user.email}, expires_delta=access_token_expires)
+    access_token = auth.create_access_token(data=auth.token_claims(user), expires_delta=access_token_expires)
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 
 
-# Function to get the current user by validating JWT
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-
-    # Fetch the user from the database
-    user = db.query(User).filter(User.email == token_data.email).first()
-    if user is None:
-        raise credentials_exception
-    return user
-
-
 @app.get("/users/me", response_model=schemas.UserResponse)
-def read_users_me(current_user: schemas.UserResponse = Depends(get_current_user)):
+async def read_users_me(current_user: schemas.CurrentUser = Depends(get_current_user)):
     return current_user
\ No newline at end of file
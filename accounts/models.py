@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -12,3 +12,12 @@ class User(Base):
     address = Column(String)
     phone_number = Column(String)
     education = Column(String)
+    token_version = Column(Integer, default=0, nullable=False)  # Bumped to revoke issued tokens
+
+class RefreshToken(Base):
+    __tablename__ = 'refresh_tokens'
+    token_hash = Column(String, primary_key=True)  # sha256 of the token's jti
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    family = Column(String, index=True)  # Shared by all tokens rotated from one login
+    expires_at = Column(DateTime, nullable=False)
+    revoked = Column(Boolean, default=False, nullable=False)
@@ -0,0 +1,118 @@
+import hashlib
+import threading
+import uuid
+from datetime import datetime, timedelta
+from cachetools import TTLCache
+from jose import JWTError, jwt
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from accounts import auth
+from accounts.models import RefreshToken
+from config import settings
+
+# Hashes of refresh tokens known to be revoked, so replays are turned away
+# without touching the database. Entries only need to outlive the tokens.
+_revoked = TTLCache(
+    maxsize=settings.refresh_revocation_cache_size,
+    ttl=settings.refresh_token_expire_days * 86400,
+)
+_lock = threading.Lock()
+
+
+def hash_jti(jti: str) -> str:
+    return hashlib.sha256(jti.encode()).hexdigest()
+
+
+def mark_revoked(token_hashes):
+    with _lock:
+        for token_hash in token_hashes:
+            _revoked[token_hash] = True
+
+
+def issue_refresh_token(db: AsyncSession, user, family: str = None) -> str:
+    """
+    Creates a refresh token for the user and records its hash. Tokens rotated
+    from the same login share a family, so a replayed token can revoke all of
+    them. The caller commits.
+    """
+    jti = uuid.uuid4().hex
+    expires_at = datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
+    family = family or uuid.uuid4().hex
+
+    db.add(RefreshToken(token_hash=hash_jti(jti), user_id=user.id, family=family, expires_at=expires_at))
+    return jwt.encode(
+        {"typ": "refresh", "uid": user.id, "ver": user.token_version or 0, "jti": jti, "fam": family, "exp": expires_at},
+        auth.SECRET_KEY,
+        algorithm=auth.ALGORITHM,
+    )
+
+
+def decode_refresh_token(token: str):
+    """The token's claims if it is a well-formed, unexpired refresh token, else None."""
+    try:
+        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("typ") != "refresh" or "jti" not in payload:
+        return None
+    return payload
+
+
+def is_revoked(payload) -> bool:
+    """In-memory check, so replays of rotated or revoked tokens cost no database read."""
+    with _lock:
+        return hash_jti(payload["jti"]) in _revoked
+
+
+async def consume_refresh_token(db: AsyncSession, payload) -> bool:
+    """
+    Revokes the presented token as part of rotating it. A single conditional
+    UPDATE both checks and revokes it; if nothing was updated the token was
+    already used (or never issued), so its whole family is revoked as a
+    precaution. The caller commits.
+    """
+    token_hash = hash_jti(payload["jti"])
+    result = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.token_hash == token_hash, RefreshToken.revoked.is_(False))
+        .values(revoked=True)
+    )
+    if result.rowcount:
+        mark_revoked([token_hash])
+        return True
+
+    await revoke_family(db, payload.get("fam"))
+    return False
+
+
+async def revoke_family(db: AsyncSession, family: str):
+    if not family:
+        return
+    hashes = await db.scalars(select(RefreshToken.token_hash).where(RefreshToken.family == family))
+    mark_revoked(hashes.all())
+    await db.execute(update(RefreshToken).where(RefreshToken.family == family).values(revoked=True))
+
+
+async def revoke_user_tokens(db: AsyncSession, user_id: int):
+    """Revokes every refresh token of the user, e.g. after a password change. The caller commits."""
+    hashes = await db.scalars(
+        select(RefreshToken.token_hash).where(RefreshToken.user_id == user_id, RefreshToken.revoked.is_(False))
+    )
+    mark_revoked(hashes.all())
+    await db.execute(update(RefreshToken).where(RefreshToken.user_id == user_id).values(revoked=True))
+
+
+async def prune_expired(db: AsyncSession, user_id: int):
+    await db.execute(
+        delete(RefreshToken).where(RefreshToken.user_id == user_id, RefreshToken.expires_at < datetime.utcnow())
+    )
+
+
+async def load_revoked(db: AsyncSession):
+    """Fills the in-memory set with the unexpired revoked tokens, e.g. at startup."""
+    hashes = await db.scalars(
+        select(RefreshToken.token_hash).where(
+            RefreshToken.revoked.is_(True), RefreshToken.expires_at >= datetime.utcnow()
+        )
+    )
+    mark_revoked(hashes.all())
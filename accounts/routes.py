@@ -1,39 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from accounts import models, schemas, auth
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from accounts import models, schemas, auth, hashing, refresh
 from accounts.models import User
-from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from accounts.dependencies import get_current_user, get_user_for_token, invalidate_user
 from datetime import timedelta
-from database import SessionLocal
+from database import get_db
 from sqlalchemy.exc import IntegrityError
 
 
 
 router = APIRouter()
 
-# OAuth2 scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-
-# Dependency for database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Signup API
 @router.post("/signup", response_model=schemas.UserResponse)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    hashed_password = await hashing.hash_password(user.password)
     try:
-        hashed_password = auth.get_password_hash(user.password)
         db_user = User(email=user.email, password=hashed_password, first_name=user.first_name, last_name=user.last_name, address=user.address, phone_number=user.phone_number, education=user.education)
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
         return db_user
     except IntegrityError:
+        await db.rollback()
         raise HTTPException(
             status_code=400,
             detail="User with this email already exists"
@@ -41,50 +30,82 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 # Login API
 @router.post("/login", response_model=schemas.Token)
-def login_for_access_token(form_data: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.email).first()
-    if not user or not auth.verify_password(form_data.password, user.password):
+async def login_for_access_token(form_data: schemas.UserLogin, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.email == form_data.email))
+    verified, new_hash = await hashing.verify_password(form_data.password, user.password) if user else (False, None)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # The stored hash used a different bcrypt cost than configured: upgrade it
+    if new_hash:
+        user.password = new_hash
+
     # Define token expiration (optional)
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    access_token = auth.create_access_token(data={"sub": user.email}, expires_delta=access_token_expires)
+    access_token = auth.create_access_token(data=auth.token_claims(user), expires_delta=access_token_expires)
 
-    return {"access_token": access_token, "token_type": "bearer"}
+    # Long-lived refresh token, so clients don't have to send the password again
+    await refresh.prune_expired(db, user.id)
+    refresh_token = refresh.issue_refresh_token(db, user)
+    await db.commit()
 
-# Function to get the current user by validating JWT
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+# Exchange a refresh token for a new access token and a new refresh token
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh_access_token(form_data: schemas.RefreshRequest, db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
+        detail="Invalid refresh token",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(email=email)
-    except JWTError:
+    payload = refresh.decode_refresh_token(form_data.refresh_token)
+    if payload is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.email == token_data.email).first()
+    # Tokens issued before a password change are no longer valid
+    user = await get_user_for_token(db, payload["uid"], payload.get("ver", 0))
     if user is None:
         raise credentials_exception
-    return user
+
+    # A replayed token (already rotated or revoked) may have been stolen, so the
+    # whole family is revoked
+    if refresh.is_revoked(payload):
+        await refresh.revoke_family(db, payload.get("fam"))
+        await db.commit()
+        raise credentials_exception
+    if not await refresh.consume_refresh_token(db, payload):
+        await db.commit()
+        raise credentials_exception
+
+    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = auth.create_access_token(data=auth.token_claims(user), expires_delta=access_token_expires)
+    refresh_token = refresh.issue_refresh_token(db, user, family=payload.get("fam"))
+    await db.commit()
+
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/logout", response_model=schemas.Message)
+async def logout(form_data: schemas.RefreshRequest, db: AsyncSession = Depends(get_db)):
+    payload = refresh.decode_refresh_token(form_data.refresh_token)
+    if payload is not None and not refresh.is_revoked(payload):
+        await refresh.revoke_family(db, payload.get("fam"))
+        await db.commit()
+
+    return {"message": "Logged out"}
 
 @router.get("/dashboard", response_model=schemas.UserResponse)
-def read_users_me(current_user: schemas.UserResponse = Depends(get_current_user)):
+async def read_users_me(current_user: schemas.CurrentUser = Depends(get_current_user)):
     return current_user
 
 @router.post("/forgot", response_model=schemas.Message)
-def forgot_password(form_data: schemas.UserForgot, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.email).first()
+async def forgot_password(form_data: schemas.UserForgot, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == form_data.email))
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -92,7 +113,11 @@ def forgot_password(form_data: schemas.UserForgot, db: Session = Depends(get_db)
     if form_data.new_password != form_data.confirm_password:
         raise HTTPException(status_code=400, detail="Passwords do not match")
     
-    user.password = auth.get_password_hash(form_data.new_password)
-    db.commit()
+    user.password = await hashing.hash_password(form_data.new_password)
+    # Revoke every token issued with the old password
+    user.token_version = (user.token_version or 0) + 1
+    await refresh.revoke_user_tokens(db, user.id)
+    await db.commit()
+    invalidate_user(user.id)
 
     return {"message": "Password updated successfully"}
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Union
 
 class UserCreate(BaseModel):
@@ -21,12 +21,25 @@ class UserResponse(BaseModel):
     first_name:str
     last_name:str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+# The authenticated user as seen by route handlers (cached between requests)
+class CurrentUser(BaseModel):
+    id: int
+    email: str
+    first_name: Union[str, None] = None
+    last_name: Union[str, None] = None
+    token_version: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Union[str, None] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     email: Union[str, None]
@@ -0,0 +1,49 @@
+"""
+Startup benchmark: imports the app in fresh interpreters, with and without the
+AI routes, and reports import time and peak memory.
+
+    python bench_startup.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+heavy = sorted(name for name in ("langchain", "langchain_core", "langchain_google_genai", "langchain_community")
+               if name in sys.modules)
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, ",".join(heavy) or "-")
+"""
+
+
+def measure(ai_routes: bool, runs: int):
+    env = dict(os.environ, AI_ROUTES_ENABLED=str(ai_routes).lower())
+    # Importing main creates and migrates the tables; keep that off the real database
+    env.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/education.db")
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True,
+                                text=True, check=True).stdout.split()
+        samples.append((float(output[0]), int(output[1]), output[2]))
+    return samples
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'AI routes':<10} {'import (median)':>16} {'import (max)':>13} {'max RSS':>10}  langchain loaded")
+    for ai_routes in (True, False):
+        samples = measure(ai_routes, runs)
+        times = [elapsed for elapsed, _, _ in samples]
+        # ru_maxrss is in KiB on Linux
+        rss = max(rss for _, rss, _ in samples) / 1024
+        print(f"{'on' if ai_routes else 'off':<10} {statistics.median(times) * 1000:>14.0f}ms "
+              f"{max(times) * 1000:>11.0f}ms {rss:>8.1f}MB  {samples[-1][2]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from pydantic import model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    # Authentication caches
+    auth_token_cache_size: int = 10000  # Decoded JWTs kept in memory
+    auth_token_cache_ttl: int = 300  # Seconds a decoded JWT is trusted without decoding again
+    auth_user_cache_size: int = 10000  # Users kept in memory
+    auth_user_cache_ttl: int = 60  # Seconds before a user is re-read (bounds staleness across workers)
+    refresh_token_expire_days: int = 30
+    refresh_revocation_cache_size: int = 100000  # Revoked refresh tokens remembered in memory
+    admin_emails: set[str] = set()  # Users allowed on maintenance endpoints; a JSON list in the environment
+
+    # Password hashing
+    bcrypt_rounds: int = 12  # bcrypt cost; existing hashes are upgraded on login when it changes
+    password_hash_workers: int = 2  # Processes dedicated to bcrypt
+    password_hash_queue_limit: int = 32  # Hash jobs allowed in flight before requests get a 503
+
+    # Quiz generation
+    ai_routes_enabled: bool = True  # Serve /users; off for auth-only workers, which then boot without the LLM stack
+    quiz_length: int = 5
+    quiz_bank_first: bool = True  # Serve stored questions before calling the LLM
+    quiz_recent_window: int = 50  # Last N served questions a user won't see again
+    llm_max_concurrency: int = 16  # LLM calls in flight per process
+    quiz_topup_attempts: int = 2  # Extra LLM calls to replace questions dropped as malformed
+    llm_provider: str = "gemini"  # gemini, groq, or fake for offline load tests
+    groq_model: str = "llama-3.1-70b-versatile"
+    fake_llm_latency: float = 2.0  # Seconds each fake LLM call takes
+    fake_llm_failure_rate: float = 0.0  # Share of fake LLM calls that raise
+    fake_llm_seed: int = 0  # Seeds the fake's question wording and failures, so runs repeat
+
+    # Generated quiz cache
+    quiz_cache_size: int = 1024  # Entries kept in memory
+    quiz_cache_ttl: int = 3600  # Seconds an in-memory entry stays valid
+    quiz_cache_persistent: bool = False  # Also keep entries in the quiz_cache table
+    quiz_cache_db_ttl: int = 86400  # Seconds a quiz_cache row stays valid
+
+    # Coalescing of identical in-flight generations
+    singleflight_cross_worker: bool = False  # Coordinate workers through the generation_locks table; needs quiz_cache_persistent
+    singleflight_lock_ttl: int = 120  # Seconds before a lock left by a dead worker is ignored
+    singleflight_poll_interval: float = 0.25  # Seconds between checks while another worker generates
+
+    # Background quiz jobs
+    quiz_job_workers: int = 4  # Jobs generated concurrently per process
+    quiz_job_queue_size: int = 100  # Jobs waiting beyond that are rejected with 503
+    quiz_job_retention: int = 86400  # Seconds finished jobs are kept
+    quiz_job_heartbeat_interval: int = 10  # Seconds between heartbeats and checks for abandoned jobs
+    quiz_job_lease: int = 60  # Seconds without a heartbeat before another worker takes a job over
+
+    # Learning resource recommendations
+    resource_refresher_enabled: bool = True  # Let this process run the refresher; one worker is elected at a time
+    resource_refresher_lease: int = 900  # Seconds the elected worker keeps the role without renewing it
+    resource_refresh_after: int = 86400  # Seconds before a topic's stored resources are fetched again
+    resource_refresh_interval: int = 300  # Seconds between refresh passes
+    resource_refresh_batch: int = 20  # Topics fetched per pass
+    resource_retry_after: int = 600  # Seconds before a failed search is retried; doubles with each failure in a row
+    resource_max_concurrency: int = 4  # Tavily searches in flight per process
+    resource_max_results: int = 5
+    resource_snippet_chars: int = 500  # Characters kept from each result's content
+
+    # Topic name/id index
+    topic_index_check_interval: float = 5.0  # Seconds between checks for topics added by other workers
+
+    # Listing endpoints
+    page_size_default: int = 100  # Rows per page when the client doesn't pass a limit
+    page_size_max: int = 500
+    stream_batch_size: int = 500  # Rows fetched from the cursor at a time when streaming NDJSON
+
+    # Instrumentation
+    metrics_enabled: bool = True  # Per-route timings, exposed on /metrics
+    server_timing_header: bool = True  # Add a Server-Timing header with each request's timings
+
+    # Debug mode: per-request profiling and N+1 query detection
+    debug_requests: bool = False  # Debug every request; for local runs only
+    debug_header_enabled: bool = False  # Debug requests sent with an X-Debug header
+    profile_dir: str = "profiles"  # Where profiles of debugged requests are written
+    profile_interval: float = 0.001  # Seconds between stack samples
+    n_plus_one_threshold: int = 5  # Times one statement may run in a request before it is flagged
+
+    # Database
+    database_url: str = "sqlite:///./education.db"
+    db_journal_mode: str = "WAL"  # WAL lets readers run alongside the writer
+    db_synchronous: str = "NORMAL"  # Safe with WAL; only the last commits can be lost on power failure
+    db_busy_timeout: int = 5000  # Milliseconds a connection waits on a lock before "database is locked"
+    db_mmap_size: int = 268435456  # Bytes of the database file memory-mapped per connection
+    db_cache_size: int = -64000  # Page cache per connection; negative values are KiB
+    db_pool_size: int = 8  # Write connections per process; at least quiz_job_workers plus busy requests
+    db_max_overflow: int = 8  # Extra connections opened under bursts
+    db_pool_timeout: int = 30  # Seconds to wait for a free connection
+    db_read_pool_size: int = 16  # Read-only connections per process, used by GET endpoints
+    db_read_max_overflow: int = 16
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    @model_validator(mode="after")
+    def check_singleflight(self):
+        # Waiting workers can only pick up another worker's quiz from the quiz_cache table
+        if self.singleflight_cross_worker and not self.quiz_cache_persistent:
+            raise ValueError("singleflight_cross_worker requires quiz_cache_persistent")
+        return self
+
+
+settings = Settings()
@@ -1,10 +1,84 @@
-from sqlalchemy import create_engine
+import orjson
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from config import settings
+import metrics
+import profiling
 
 Base = declarative_base()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./education.db"
+SQLALCHEMY_DATABASE_URL = settings.database_url
+ASYNC_SQLALCHEMY_DATABASE_URL = make_url(SQLALCHEMY_DATABASE_URL).set(drivername="sqlite+aiosqlite")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+
+def apply_pragmas(dbapi_connection, read_only: bool = False):
+    """Per-connection SQLite settings, run once when the pool opens a connection."""
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        # Stored in the database file, but only a writer can switch it
+        cursor.execute(f"PRAGMA journal_mode={settings.db_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={settings.db_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.db_busy_timeout)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.db_mmap_size)}")
+    cursor.execute(f"PRAGMA cache_size={int(settings.db_cache_size)}")
+    if read_only:
+        # Any write on this connection fails instead of taking the write lock
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def make_engine(url=SQLALCHEMY_DATABASE_URL, is_async: bool = False, read_only: bool = False):
+    """
+    Creates an engine on the SQLite database with the configured pragmas and pool
+    size. Read-only engines get their own, larger pool so GET endpoints don't
+    queue behind writers for a connection.
+    """
+    options = {
+        "pool_size": settings.db_read_pool_size if read_only else settings.db_pool_size,
+        "max_overflow": settings.db_read_max_overflow if read_only else settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "connect_args": {"check_same_thread": False, "timeout": settings.db_busy_timeout / 1000},
+        # JSON columns are encoded and decoded with orjson
+        "json_serializer": lambda value: orjson.dumps(value).decode(),
+        "json_deserializer": orjson.loads,
+    }
+    if is_async:
+        new_engine = create_async_engine(url, poolclass=AsyncAdaptedQueuePool, **options)
+        sync_engine = new_engine.sync_engine
+    else:
+        new_engine = sync_engine = create_engine(url, **options)
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, read_only)
+
+    metrics.instrument_engine(sync_engine)
+    profiling.instrument_engine(sync_engine)
+
+    return new_engine
+
+
+# Synchronous engine, used for create_all, migrations and command-line tools
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engines used by the request handlers and background tasks
+async_engine = make_engine(ASYNC_SQLALCHEMY_DATABASE_URL, is_async=True)
+read_engine = make_engine(ASYNC_SQLALCHEMY_DATABASE_URL, is_async=True, read_only=True)
+# expire_on_commit=False: objects stay readable after commit without an implicit (sync) refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(read_engine, autoflush=False, expire_on_commit=False)
+
+# Dependency for database session
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Dependency for a read-only database session
+async def get_read_db():
+    async with ReadSessionLocal() as db:
+        yield db
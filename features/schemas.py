@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class UserPreferenceBase(BaseModel):
     difficulty_level: str  # e.g., beginner, intermediate, advanced
@@ -10,5 +10,4 @@ class UserPreferenceCreate(UserPreferenceBase):
 class UserPreference(UserPreferenceBase):
     id: int  # Include the ID for the response
 
-    class Config:
-        orm_mode = True  # Enable ORM mode to read data from SQLAlchemy models
+    model_config = ConfigDict(from_attributes=True)  # Read data from SQLAlchemy models
@@ -1,15 +1,21 @@
 # main.py
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from accounts.routes import router as accounts_router
-from user_preference.routes import router as preferences_router
-from database import SessionLocal, engine
+from database import AsyncSessionLocal, async_engine, read_engine, engine
 # import accounts.models as models
 from accounts.models import Base as AccountsBase
 from user_preference.models import Base as PreferencesBase
+from migrations import run_migrations
+from accounts import hashing, refresh
+from config import settings
+import metrics
+import profiling
 
-app = FastAPI()
+# orjson serializes responses several times faster than the stdlib encoder
+app = FastAPI(default_response_class=ORJSONResponse)
 
 
 # Configure CORS
@@ -20,10 +26,60 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Time every request and report it on /metrics and in a Server-Timing header
+app.add_middleware(metrics.MetricsMiddleware)
+# Opt-in profiling and N+1 query detection for single requests
+app.add_middleware(profiling.DebugMiddleware)
+
 # Create the tables for both apps
 AccountsBase.metadata.create_all(bind=engine)
 PreferencesBase.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+# Close the async engines' connections
+@app.on_event("shutdown")
+async def dispose_async_engines():
+    await async_engine.dispose()
+    await read_engine.dispose()
+
+@app.on_event("startup")
+async def load_revoked_refresh_tokens():
+    async with AsyncSessionLocal() as db:
+        await refresh.load_revoked(db)
+
+@app.on_event("shutdown")
+def stop_password_hashing():
+    hashing.shutdown_pool()
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Include the routers
 app.include_router(accounts_router,prefix="/accounts", tags=["accounts"])
-app.include_router(preferences_router, prefix="/users", tags=["preferences"])
\ No newline at end of file
+
+# The quiz routes, job workers and resource refresher; auth-only workers skip them
+if settings.ai_routes_enabled:
+    from user_preference.routes import router as preferences_router
+    from user_preference import jobs, resources
+
+    app.include_router(preferences_router, prefix="/users", tags=["preferences"])
+
+    # Start the background quiz job workers, resuming jobs left over from a previous run
+    @app.on_event("startup")
+    async def start_quiz_jobs():
+        await jobs.start_workers()
+
+    @app.on_event("shutdown")
+    async def stop_quiz_jobs():
+        await jobs.stop_workers()
+
+    # Keep topic resources for recommendations fetched ahead of time
+    @app.on_event("startup")
+    async def start_resource_refresher():
+        resources.start_refresher()
+
+    @app.on_event("shutdown")
+    async def stop_resource_refresher():
+        await resources.stop_refresher()
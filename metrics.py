@@ -0,0 +1,230 @@
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from config import settings
+
+# Route label for work done outside a request (job workers, refreshers, startup)
+BACKGROUND = "background"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., count, sum]
+
+    def observe(self, labels: tuple, value: float):
+        with _lock:
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in sorted(self._series.items()):
+            base = format_labels(self.label_names, labels)
+            for bound, count in zip(self.buckets, series):
+                yield f'{self.name}_bucket{{{base},le="{bound}"}} {count}'
+            yield f'{self.name}_bucket{{{base},le="+Inf"}} {series[-2]}'
+            yield f"{self.name}_count{{{base}}} {series[-2]}"
+            yield f"{self.name}_sum{{{base}}} {series[-1]}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series = {}
+
+    def inc(self, labels: tuple, amount: float = 1):
+        with _lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._series.items()):
+            yield f"{self.name}{{{format_labels(self.label_names, labels)}}} {value}"
+
+
+def format_labels(names, values):
+    return ",".join(f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                    for name, value in zip(names, values))
+
+
+_lock = threading.Lock()
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time spent serving HTTP requests.", ("method", "route", "status"))
+dependency_duration = Histogram(
+    "app_dependency_duration_seconds", "Latency of database queries and LLM, Tavily and bcrypt calls.",
+    ("route", "kind"))
+dependency_calls = Counter(
+    "app_dependency_calls_total", "Database queries and LLM, Tavily and bcrypt calls.", ("route", "kind"))
+dependency_seconds = Counter(
+    "app_dependency_seconds_total", "Total time spent in each kind of dependency.", ("route", "kind"))
+llm_tokens = Counter("app_llm_tokens_total", "LLM tokens used.", ("route", "type"))
+
+REGISTRY = [request_duration, dependency_duration, dependency_calls, dependency_seconds, llm_tokens]
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+class RequestTimings:
+    """
+    The dependency calls of one request. They are published once the request
+    is done, when its route is known, and summed up for the Server-Timing header.
+    """
+
+    def __init__(self):
+        self.calls = []  # (kind, seconds)
+        self.tokens = [0, 0]  # input, output
+        self.totals = {}  # kind -> [calls, seconds]
+        # Tasks started during the request (job workers, shared generations)
+        # inherit it; once it is published they record as background work
+        self.published = False
+
+    def add(self, kind: str, seconds: float):
+        self.calls.append((kind, seconds))
+        totals = self.totals.setdefault(kind, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+    def publish(self, route: str):
+        self.published = True
+        for kind, seconds in self.calls:
+            observe_call(route, kind, seconds)
+        add_tokens(route, *self.tokens)
+
+    def server_timing(self, total_seconds: float) -> str:
+        parts = [
+            f'{kind};dur={seconds * 1000:.1f};desc="{calls} call{"s" if calls != 1 else ""}"'
+            for kind, (calls, seconds) in self.totals.items()
+        ]
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar = ContextVar("request_timings", default=None)
+
+
+def observe_call(route: str, kind: str, seconds: float):
+    dependency_duration.observe((route, kind), seconds)
+    dependency_calls.inc((route, kind))
+    dependency_seconds.inc((route, kind), seconds)
+
+
+def add_tokens(route: str, input_tokens: int, output_tokens: int):
+    if input_tokens or output_tokens:
+        llm_tokens.inc((route, "input"), input_tokens)
+        llm_tokens.inc((route, "output"), output_tokens)
+
+
+def record(kind: str, seconds: float):
+    """Records one call of `kind` (db, llm, tavily, bcrypt) against the current request."""
+    if not settings.metrics_enabled:
+        return
+    timings = _current.get()
+    if timings is not None and not timings.published:
+        timings.add(kind, seconds)
+    else:
+        observe_call(BACKGROUND, kind, seconds)
+
+
+def record_tokens(message):
+    """Adds the token usage reported on an LLM message, when the provider reports it."""
+    usage = getattr(message, "usage_metadata", None)
+    if not usage or not settings.metrics_enabled:
+        return
+    input_tokens, output_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    timings = _current.get()
+    if timings is not None and not timings.published:
+        timings.tokens[0] += input_tokens
+        timings.tokens[1] += output_tokens
+    else:
+        add_tokens(BACKGROUND, input_tokens, output_tokens)
+
+
+@asynccontextmanager
+async def atimed(kind: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    """Times every statement the engine runs as a "db" call."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record("db", time.perf_counter() - conn.info["query_start"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            record("db", time.perf_counter() - starts.pop())
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each request under its route template, and adding a
+    Server-Timing header with the request's db/llm/tavily/bcrypt totals.
+    Plain ASGI rather than BaseHTTPMiddleware so streaming responses pass through
+    untouched and the handlers see the same context.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.metrics_enabled:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.server_timing_header:
+                    header = timings.server_timing(time.perf_counter() - start)
+                    message.setdefault("headers", []).append((b"server-timing", header.encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = route_path(scope)
+            request_duration.observe((scope["method"], route, status), time.perf_counter() - start)
+            timings.publish(route)
+
+
+def route_path(scope) -> str:
+    # The template ("/users/generate-quiz/jobs/{job_id}"), not the raw path, keeps label counts bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
@@ -0,0 +1,136 @@
+import json
+from sqlalchemy import inspect, text
+
+# Columns added to existing tables after they were first created.
+# create_all() only creates missing tables, so these are applied by hand.
+ADDED_COLUMNS = {
+    "users": {
+        "token_version": "INTEGER NOT NULL DEFAULT 0",
+    },
+    "questions": {
+        "quiz_format": "VARCHAR",
+        "difficulty_level": "VARCHAR",
+        "content_hash": "VARCHAR",
+    },
+    "quiz_jobs": {
+        "owner": "VARCHAR",
+        "heartbeat_at": "DATETIME",
+    },
+}
+
+
+def add_missing_columns(conn):
+    inspector = inspect(conn)
+    for table, columns in ADDED_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for name, ddl in columns.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def backfill_question_formats(conn):
+    # Questions stored before formats were recorded: a true/false pair of options
+    # means a True/False question, anything else was generated as MCQs.
+    conn.execute(text(
+        "UPDATE questions SET quiz_format = CASE "
+        "WHEN lower(replace(options, ' ', '')) = '[\"true\",\"false\"]' THEN 'true/false' "
+        "ELSE 'mcqs' END "
+        "WHERE quiz_format IS NULL"
+    ))
+
+
+def backfill_question_hashes(conn):
+    from user_preference.quiz_bank import question_hash
+
+    rows = conn.execute(text(
+        "SELECT id, question, options, correct FROM questions WHERE content_hash IS NULL ORDER BY id"
+    )).all()
+    if rows:
+        conn.execute(
+            text("UPDATE questions SET content_hash = :content_hash WHERE id = :id"),
+            [
+                {"id": row.id, "content_hash": question_hash(row.question, json.loads(row.options), row.correct)}
+                for row in rows
+            ],
+        )
+
+        # Collapse duplicates onto the oldest copy so the unique index can be built
+        conn.execute(text(
+            "UPDATE served_questions SET question_id = ("
+            "  SELECT min(keep.id) FROM questions keep JOIN questions dup ON dup.content_hash = keep.content_hash"
+            "  WHERE dup.id = served_questions.question_id"
+            ") WHERE question_id IN (SELECT id FROM questions)"
+        ))
+        conn.execute(text(
+            "DELETE FROM questions WHERE id NOT IN (SELECT min(id) FROM questions GROUP BY content_hash)"
+        ))
+
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_questions_content_hash ON questions (content_hash)"
+    ))
+
+
+def merge_duplicate_performance(conn):
+    # Before the unique index, racing track_performance calls could create
+    # several rows for one user and topic. Fold them into the oldest row.
+    conn.execute(text(
+        "UPDATE user_performance SET "
+        "correct_count = (SELECT sum(coalesce(p.correct_count, 0)) FROM user_performance p "
+        "  WHERE p.user_id = user_performance.user_id AND p.topic_id = user_performance.topic_id), "
+        "incorrect_count = (SELECT sum(coalesce(p.incorrect_count, 0)) FROM user_performance p "
+        "  WHERE p.user_id = user_performance.user_id AND p.topic_id = user_performance.topic_id) "
+        "WHERE id IN (SELECT min(id) FROM user_performance GROUP BY user_id, topic_id HAVING count(*) > 1)"
+    ))
+    conn.execute(text(
+        "DELETE FROM user_performance WHERE id NOT IN (SELECT min(id) FROM user_performance GROUP BY user_id, topic_id)"
+    ))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_user_performance_user_topic ON user_performance (user_id, topic_id)"
+    ))
+
+
+def seed_question_attempts(conn):
+    # Counters recorded before the answer log existed become attempts with no
+    # question or timestamp, so rebuilding the aggregates from the log keeps them
+    if conn.execute(text("SELECT 1 FROM question_attempts LIMIT 1")).first():
+        return
+    conn.execute(text(
+        "WITH RECURSIVE n(i) AS ("
+        "  SELECT 1 UNION ALL SELECT i + 1 FROM n"
+        "  WHERE i < (SELECT max(max(correct_count), max(incorrect_count)) FROM user_performance)"
+        ") "
+        "INSERT INTO question_attempts (user_id, topic_id, is_correct) "
+        "SELECT p.user_id, p.topic_id, 1 FROM user_performance p JOIN n ON n.i <= p.correct_count "
+        "UNION ALL "
+        "SELECT p.user_id, p.topic_id, 0 FROM user_performance p JOIN n ON n.i <= p.incorrect_count"
+    ))
+
+
+def add_missing_indexes(conn):
+    # Indexes declared on models after their tables were first created
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_user_topics_user_id ON user_topics (user_id)"))
+
+
+def normalize_question_options(conn):
+    # questions.options moved from a hand-encoded JSON string to a JSON column.
+    # Stored values are rewritten once in SQLite's canonical JSON form, and
+    # anything that isn't valid JSON becomes a one-element list so every row decodes.
+    if conn.execute(text("PRAGMA user_version")).scalar() >= 1:
+        return
+    conn.execute(text("UPDATE questions SET options = json_array(options) WHERE json_valid(options) = 0"))
+    conn.execute(text("UPDATE questions SET options = json(options) WHERE options != json(options)"))
+    conn.execute(text("PRAGMA user_version = 1"))
+
+
+def run_migrations(engine):
+    with engine.begin() as conn:
+        add_missing_columns(conn)
+        # Before anything that decodes options: it repairs values that aren't JSON
+        normalize_question_options(conn)
+        backfill_question_formats(conn)
+        backfill_question_hashes(conn)
+        merge_duplicate_performance(conn)
+        seed_question_attempts(conn)
+        add_missing_indexes(conn)
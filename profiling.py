@@ -0,0 +1,171 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from config import settings
+from metrics import route_path
+
+logger = logging.getLogger(__name__)
+
+DEBUG_HEADER = b"x-debug"
+
+_current: ContextVar = ContextVar("request_debug", default=None)
+_collectors = []  # Lists receiving every debugged request, see assert_no_n_plus_one
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapses whitespace and IN lists, so the same query with other ids groups together."""
+    statement = re.sub(r"\s+", " ", statement).strip()
+    statement = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?)", statement)
+    return re.sub(r"\b\d+\b", "?", statement)
+
+
+class RequestDebug:
+    """The SQL statements of one debugged request, grouped by normalized text."""
+
+    def __init__(self, method: str):
+        self.method = method
+        self.route = "unmatched"
+        self.statements = Counter()
+
+    def record(self, statement: str):
+        self.statements[normalize_statement(statement)] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Statements run more than `threshold` times, the usual sign of an N+1 loop."""
+        return [(statement, count) for statement, count in self.statements.most_common() if count > threshold]
+
+
+def instrument_engine(engine):
+    """Records the engine's statements on the current request while it is being debugged."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        debug = _current.get()
+        if debug is not None:
+            debug.record(statement)
+
+
+class Sampler:
+    """
+    Wall-clock sampling profiler for one thread. Every `interval` seconds a
+    helper thread records the target thread's stack; the result is in the
+    folded format flame graph tools read. Profiling the event loop thread also
+    catches other requests running while this one waits on I/O.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile_path(method: str, scope) -> str:
+    name = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+    return os.path.join(settings.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{time.monotonic_ns()}-{method}-{name}.folded")
+
+
+class DebugMiddleware:
+    """
+    Debug mode for single requests: on with the X-Debug header when
+    debug_header_enabled is set, or for every request with debug_requests.
+    A debugged request is profiled and its profile written to profile_dir
+    (named in the X-Debug-Profile header); statements repeated more than
+    n_plus_one_threshold times are logged as likely N+1 queries.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled(scope):
+            return await self.app(scope, receive, send)
+
+        debug = RequestDebug(scope["method"])
+        token = _current.set(debug)
+        sampler = None
+        path = None
+        if settings.debug_requests or (settings.debug_header_enabled and DEBUG_HEADER in dict(scope["headers"])):
+            sampler = Sampler(threading.get_ident(), settings.profile_interval)
+            path = profile_path(scope["method"], scope)
+            sampler.start()
+
+        async def send_with_debug(message):
+            if message["type"] == "http.response.start" and path:
+                message.setdefault("headers", []).append((b"x-debug-profile", path.encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_debug)
+        finally:
+            _current.reset(token)
+            debug.route = route_path(scope)
+            if sampler is not None:
+                sampler.stop()
+                os.makedirs(settings.profile_dir, exist_ok=True)
+                with open(path, "w") as profile:
+                    profile.write(sampler.folded())
+            for statement, count in debug.repeated(settings.n_plus_one_threshold):
+                logger.warning("Possible N+1 query in %s %s: ran %d times: %s",
+                               debug.method, debug.route, count, statement)
+            for collector in _collectors:
+                collector.append(debug)
+
+    @staticmethod
+    def enabled(scope) -> bool:
+        if settings.debug_requests or _collectors:
+            return True
+        return settings.debug_header_enabled and DEBUG_HEADER in dict(scope["headers"])
+
+
+@contextmanager
+def assert_no_n_plus_one(threshold: int = None):
+    """
+    Test helper: records the statements of every request handled inside the
+    block and fails if any of them ran one statement more than `threshold`
+    (default n_plus_one_threshold) times.
+    """
+    requests = []
+    _collectors.append(requests)
+    try:
+        yield requests
+    finally:
+        _collectors.remove(requests)
+
+    threshold = settings.n_plus_one_threshold if threshold is None else threshold
+    offenders = [
+        f"{debug.method} {debug.route}: {count}x {statement}"
+        for debug in requests
+        for statement, count in debug.repeated(threshold)
+    ]
+    if offenders:
+        raise AssertionError("Repeated queries (possible N+1):\n" + "\n".join(offenders))
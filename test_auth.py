@@ -0,0 +1,44 @@
+import os
+import tempfile
+
+# Point the app at a throwaway database before anything opens the real one
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/education.db"
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture(scope="module")
+def tokens():
+    client = TestClient(main.app)
+    client.post("/accounts/signup", json=dict(email="tokens@example.com", password="pw", first_name="a",
+                                              last_name="b", address="c", phone_number="1", education="e"))
+    response = client.post("/accounts/login", json=dict(email="tokens@example.com", password="pw"))
+    assert response.status_code == 200
+    return client, response.json()
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_access_token_authenticates(tokens):
+    client, issued = tokens
+    assert client.get("/accounts/dashboard", headers=bearer(issued["access_token"])).status_code == 200
+
+
+def test_refresh_token_is_not_an_access_token(tokens):
+    client, issued = tokens
+    assert client.get("/accounts/dashboard", headers=bearer(issued["refresh_token"])).status_code == 401
+    assert client.get("/users/profile", headers=bearer(issued["refresh_token"])).status_code == 401
+
+
+def test_quiz_cache_invalidation_is_for_admins(tokens, monkeypatch):
+    client, issued = tokens
+    headers = bearer(issued["access_token"])
+    assert client.delete("/users/quiz-cache", headers=headers).status_code == 403
+
+    monkeypatch.setattr(main.settings, "admin_emails", {"tokens@example.com"})
+    assert client.delete("/users/quiz-cache", headers=headers).status_code == 200
@@ -0,0 +1,151 @@
+import os
+import tempfile
+
+# Point the app at a throwaway database before anything opens the real one
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/education.db"
+
+import asyncio
+from contextlib import contextmanager
+from datetime import timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+
+import main
+from accounts import auth
+from accounts.models import User
+from database import AsyncSessionLocal, SessionLocal, async_engine, read_engine
+from profiling import DebugMiddleware, assert_no_n_plus_one
+from user_preference import models, quiz_service
+from user_preference.schemas import Quiz, QuizQuestion
+
+
+@contextmanager
+def count_queries():
+    """Counts the SQL statements the app's async engines run inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = [async_engine.sync_engine, read_engine.sync_engine]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def create_user_with_topics(email, topic_count):
+    """Creates a user with `topic_count` selected topics and performance rows, returns auth headers."""
+    with SessionLocal() as db:
+        user = User(email=email, password="x", first_name="a", last_name="b",
+                    address="c", phone_number="1", education="e")
+        db.add(user)
+        db.flush()
+        for i in range(topic_count):
+            topic = models.Topic(name=f"{email} topic {i}")
+            db.add(topic)
+            db.flush()
+            db.add(models.UserTopic(user_id=user.id, topic_id=topic.id))
+            db.add(models.UserPerformance(user_id=user.id, topic_id=topic.id,
+                                          correct_count=i, incorrect_count=1))
+        db.commit()
+        token = auth.create_access_token(data=auth.token_claims(user), expires_delta=timedelta(minutes=5))
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("path", ["/users/user_performance", "/users/profile"])
+def test_one_query_regardless_of_topic_count(client, path):
+    counts = {}
+    for topic_count in (1, 200):
+        headers = create_user_with_topics(f"{path}-{topic_count}@example.com", topic_count)
+        # The first request also loads the user for the auth cache
+        assert client.get(path, headers=headers).status_code == 200
+
+        with count_queries() as statements:
+            response = client.get(path, headers=headers)
+        assert response.status_code == 200
+        counts[topic_count] = len(statements)
+
+    assert counts == {1: 1, 200: 1}
+
+
+def test_user_performance_percentages(client):
+    headers = create_user_with_topics("percentages@example.com", 3)
+    performance = client.get("/users/user_performance", headers=headers).json()["overall_performance"]
+    assert [row["percentage"] for row in performance] == [0, 50, pytest.approx(200 / 3)]
+
+
+def test_profile_lists_selected_topics(client):
+    headers = create_user_with_topics("profile@example.com", 2)
+    profile = client.get("/users/profile", headers=headers).json()
+    assert profile["email"] == "profile@example.com"
+    assert [topic["name"] for topic in profile["selected_topics"]] == [
+        "profile@example.com topic 0", "profile@example.com topic 1"
+    ]
+
+
+def test_no_repeated_queries_with_many_topics(client):
+    headers = create_user_with_topics("many@example.com", 200)
+    with assert_no_n_plus_one(threshold=1):
+        for path in ("/users/user_performance", "/users/profile", "/users/preferences", "/users/gettopics"):
+            client.get(path, headers=headers)
+
+
+def test_llm_wait_holds_no_connections(monkeypatch):
+    """More concurrent generations than the pool has connections all succeed."""
+    pool = async_engine.sync_engine.pool
+    concurrency = pool.size() + pool._max_overflow + 4
+    headers = create_user_with_topics("concurrent@example.com", 2)
+    with SessionLocal() as db:
+        user_id = db.query(User.id).filter(User.email == "concurrent@example.com").scalar()
+        db.add(models.UserPreference(user_id=user_id, difficulty_level="easy", quiz_format="MCQs"))
+        db.commit()
+
+    async def slow_generation(preferences, topics, number_of_questions):
+        await asyncio.sleep(0.5)
+        return Quiz(root=[
+            QuizQuestion(question=f"{topics[i % len(topics)]} question {i}?", options=["a", "b"],
+                         correct="a", topic=topics[i % len(topics)])
+            for i in range(number_of_questions)
+        ])
+
+    monkeypatch.setattr(quiz_service, "agenerate_quiz_with_langchain", slow_generation)
+
+    async def generate_all():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[
+                client.post("/users/generate-quiz/", headers=headers) for _ in range(concurrency)
+            ])
+
+    # Requests holding a connection through the LLM wait would queue on the
+    # pool until db_pool_timeout instead
+    responses = asyncio.run(asyncio.wait_for(generate_all(), timeout=10))
+    assert [response.status_code for response in responses] == [200] * concurrency
+
+
+def test_n_plus_one_detector_flags_query_loops():
+    app = FastAPI()
+    app.add_middleware(DebugMiddleware)
+
+    @app.get("/loop")
+    async def loop():
+        async with AsyncSessionLocal() as db:
+            for topic_id in range(10):
+                await db.scalar(select(models.Topic.name).where(models.Topic.id == topic_id))
+
+    with pytest.raises(AssertionError, match="GET /loop: 10x SELECT topics.name"):
+        with assert_no_n_plus_one():
+            TestClient(app).get("/loop")
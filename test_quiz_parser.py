@@ -0,0 +1,65 @@
+import json
+
+from user_preference.quiz_parser import parse_quiz_output
+
+
+def question(n):
+    return {"question": f"Question {n}?", "options": ["a", "b"], "correct": "a", "topic": "AI"}
+
+
+def reply(*questions):
+    return json.dumps(list(questions), indent=2)
+
+
+def texts(result):
+    return [item.question for item in result.questions]
+
+
+def test_plain_array():
+    result = parse_quiz_output(reply(question(1), question(2)))
+    assert texts(result) == ["Question 1?", "Question 2?"]
+    assert result.rejects == []
+
+
+def test_markdown_fences_and_trailing_text():
+    text = "Here is your quiz:\n```json\n" + reply(question(1), question(2)) + "\n```\nLet me know if you want more."
+    result = parse_quiz_output(text)
+    assert texts(result) == ["Question 1?", "Question 2?"]
+    assert result.rejects == []
+
+
+def test_truncated_reply_keeps_complete_questions():
+    text = reply(question(1), question(2))
+    result = parse_quiz_output(text[:text.rindex("{") + 20])
+    assert texts(result) == ["Question 1?"]
+    assert len(result.rejects) == 1
+
+
+def test_invalid_question_is_rejected_alone():
+    result = parse_quiz_output(reply(question(1), {"question": "No options?"}, question(3)))
+    assert texts(result) == ["Question 1?", "Question 3?"]
+    assert result.rejects == ['{\n    "question": "No options?"\n  }']
+
+
+def test_wrapper_object():
+    result = parse_quiz_output(json.dumps({"questions": [question(1), question(2)]}))
+    assert texts(result) == ["Question 1?", "Question 2?"]
+    assert result.rejects == []
+
+
+def test_nested_wrapper_in_fences():
+    text = "```json\n" + json.dumps({"quiz": {"questions": [question(1)]}}) + "\n```"
+    assert texts(parse_quiz_output(text)) == ["Question 1?"]
+
+
+def test_truncated_wrapper_object():
+    text = json.dumps({"questions": [question(1), question(2)]})
+    result = parse_quiz_output(text[:text.rindex("{") + 20])
+    assert texts(result) == ["Question 1?"]
+    assert len(result.rejects) == 1
+
+
+def test_object_without_questions_is_rejected():
+    result = parse_quiz_output('{"error": "quota exceeded"}')
+    assert result.questions == []
+    assert result.rejects == ['{"error": "quota exceeded"}']
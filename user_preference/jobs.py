@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from user_preference import models, schemas
+from user_preference.quiz_service import build_quiz
+from user_preference.singleflight import OWNER
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_queue: asyncio.Queue = None
+_workers: list[asyncio.Task] = []
+
+
+def job_response(job: models.QuizJob) -> schemas.QuizJobResponse:
+    return schemas.QuizJobResponse(
+        job_id=job.id,
+        status=job.status,
+        quiz=json.loads(job.result) if job.result else None,
+        error=job.error,
+    )
+
+
+async def run_job(job_id: str):
+    async with AsyncSessionLocal() as db:
+        # Claimed atomically: a job taken over by another worker in the meantime is left alone
+        claimed = await db.execute(
+            update(models.QuizJob)
+            .where(models.QuizJob.id == job_id, models.QuizJob.status == "queued", models.QuizJob.owner == OWNER)
+            .values(status="running", heartbeat_at=datetime.utcnow())
+        )
+        await db.commit()
+        if not claimed.rowcount:
+            return
+        job = await db.get(models.QuizJob, job_id)
+
+        try:
+            # Same session, so a job holds one connection, and none while the LLM runs
+            quiz_data = await build_quiz(db, job.user_id)
+            job.result = json.dumps([item.model_dump() for item in quiz_data])
+            job.status = "done"
+        except HTTPException as exc:
+            await db.rollback()
+            job.status = "failed"
+            job.error = exc.detail
+        except Exception:
+            logger.exception("Quiz job %s failed", job_id)
+            await db.rollback()
+            job.status = "failed"
+            job.error = "Quiz generation failed"
+
+        job.finished_at = datetime.utcnow()
+        await db.commit()
+
+
+async def worker():
+    while True:
+        job_id = await _queue.get()
+        try:
+            await run_job(job_id)
+        except Exception:
+            logger.exception("Quiz job %s could not be updated", job_id)
+        finally:
+            _queue.task_done()
+
+
+async def heartbeat(db: AsyncSession):
+    """Marks this process's queued and running jobs as still owned."""
+    await db.execute(
+        update(models.QuizJob)
+        .where(models.QuizJob.owner == OWNER, models.QuizJob.status.in_(("queued", "running")))
+        .values(heartbeat_at=datetime.utcnow())
+    )
+
+
+async def recover_jobs(db: AsyncSession):
+    """
+    Takes over queued or running jobs whose owner stopped sending heartbeats,
+    e.g. a worker that crashed or was restarted, as far as the queue has room.
+    Jobs of live workers are left alone, so no job runs twice.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.quiz_job_lease)
+    abandoned = (
+        models.QuizJob.status.in_(("queued", "running")),
+        or_(models.QuizJob.heartbeat_at.is_(None), models.QuizJob.heartbeat_at < cutoff),
+    )
+    room = _queue.maxsize - _queue.qsize()
+    if room <= 0:
+        return
+
+    job_ids = (await db.scalars(
+        select(models.QuizJob.id).where(*abandoned).order_by(models.QuizJob.created_at).limit(room)
+    )).all()
+    for job_id in job_ids:
+        # Conditional, so when two workers recover at once only one gets each job
+        taken = await db.execute(
+            update(models.QuizJob)
+            .where(models.QuizJob.id == job_id, *abandoned)
+            .values(status="queued", owner=OWNER, heartbeat_at=datetime.utcnow())
+        )
+        await db.commit()
+        if taken.rowcount:
+            _queue.put_nowait(job_id)
+
+
+async def supervisor():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await heartbeat(db)
+                await db.commit()
+                await recover_jobs(db)
+        except Exception:
+            logger.exception("Quiz job heartbeat failed")
+        await asyncio.sleep(settings.quiz_job_heartbeat_interval)
+
+
+async def start_workers():
+    """
+    Starts the worker pool on the running event loop, along with the task
+    that keeps this process's jobs alive and takes over jobs abandoned by
+    other processes. Safe to call more than once.
+    """
+    global _queue
+    if _queue is not None:
+        return
+
+    _queue = asyncio.Queue(maxsize=settings.quiz_job_queue_size)
+    for _ in range(settings.quiz_job_workers):
+        _workers.append(asyncio.create_task(worker()))
+
+    async with AsyncSessionLocal() as db:
+        # Forget finished jobs past their retention
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.quiz_job_retention)
+        await db.execute(delete(models.QuizJob).where(
+            models.QuizJob.status.in_(("done", "failed")),
+            models.QuizJob.finished_at < cutoff,
+        ))
+        await db.commit()
+
+    # Its first pass picks up what a previous process left behind
+    _workers.append(asyncio.create_task(supervisor()))
+
+
+async def stop_workers():
+    global _queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+
+
+async def submit_job(db: AsyncSession, user_id: int) -> models.QuizJob:
+    await start_workers()
+    if _queue.full():
+        raise HTTPException(status_code=503, detail="Too many quiz jobs queued, try again later")
+
+    job = models.QuizJob(id=uuid.uuid4().hex, user_id=user_id, status="queued",
+                         owner=OWNER, heartbeat_at=datetime.utcnow())
+    db.add(job)
+    await db.commit()
+    try:
+        _queue.put_nowait(job.id)
+    except asyncio.QueueFull:
+        # Another request filled the queue while this one was committing
+        job.status = "failed"
+        job.error = "Too many quiz jobs queued, try again later"
+        job.finished_at = datetime.utcnow()
+        await db.commit()
+        raise HTTPException(status_code=503, detail=job.error)
+    return job
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index, Boolean, Date, JSON
+from datetime import datetime
 from sqlalchemy.orm import relationship
 from database import Base
 from accounts.models import User  # Import the User model from accounts
@@ -14,6 +15,42 @@ class UserPerformance(Base):
     
     topic = relationship("Topic", back_populates="performances")
 
+    __table_args__ = (
+        # One row per user and topic; track_performance upserts against it
+        Index('uq_user_performance_user_topic', 'user_id', 'topic_id', unique=True),
+    )
+
+class UserDailyPerformance(Base):
+    __tablename__ = 'user_daily_performance'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'))
+    day = Column(Date, nullable=False)  # UTC
+    correct_count = Column(Integer, default=0)
+    incorrect_count = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index('uq_user_daily_performance_user_day', 'user_id', 'day', unique=True),
+    )
+
+class QuestionAttempt(Base):
+    # Append-only log of every submitted answer; user_performance and
+    # user_daily_performance are aggregates of it (see user_preference/performance.py)
+    __tablename__ = 'question_attempts'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    question_id = Column(Integer, ForeignKey('questions.id'))  # Unknown for answers sent without an id
+    topic_id = Column(Integer, ForeignKey('topics.id'), nullable=False)
+    is_correct = Column(Boolean, nullable=False)
+    quiz_format = Column(String)
+    difficulty_level = Column(String)
+    answered_at = Column(DateTime, default=datetime.utcnow)  # Unknown for answers from before the log
+
+    __table_args__ = (
+        Index('ix_question_attempts_user_answered', 'user_id', 'answered_at'),
+    )
+
 class Topic(Base):
     __tablename__ = 'topics'
     id = Column(Integer, primary_key=True, index=True)
@@ -33,7 +70,7 @@ class UserPreference(Base):
 class UserTopic(Base):
     __tablename__ = 'user_topics'
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     topic_id = Column(Integer, ForeignKey('topics.id'))
 
     user = relationship("User", back_populates="user_topics")
@@ -44,8 +81,59 @@ class Question(Base):
     id = Column(Integer, primary_key=True)
     topic_id = Column(Integer, ForeignKey('topics.id'))
     question = Column(String, nullable=False)
-    options = Column(String, nullable=False)  # JSON stored as string
+    options = Column(JSON, nullable=False)  # List of answer options
     correct = Column(String, nullable=False)
+    quiz_format = Column(String, index=True)  # Normalized, e.g. "mcqs" or "true/false"
+    difficulty_level = Column(String)
+    content_hash = Column(String, unique=True, index=True)  # See quiz_bank.question_hash
+
+class ServedQuestion(Base):
+    __tablename__ = 'served_questions'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    question_id = Column(Integer, ForeignKey('questions.id'))
+    served_at = Column(DateTime, default=datetime.utcnow)
+
+class QuizCacheEntry(Base):
+    __tablename__ = 'quiz_cache'
+    key = Column(String, primary_key=True)  # Preference fingerprint
+    payload = Column(Text, nullable=False)  # JSON: question ids and quiz items
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class GenerationLock(Base):
+    __tablename__ = 'generation_locks'
+    key = Column(String, primary_key=True)  # Preference fingerprint being generated
+    owner = Column(String, nullable=False)  # host:pid of the worker holding the lock
+    expires_at = Column(DateTime, nullable=False)
+
+class QuizJob(Base):
+    __tablename__ = 'quiz_jobs'
+    id = Column(String, primary_key=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, done, failed
+    result = Column(Text)  # JSON list of quiz questions once done
+    error = Column(String)
+    owner = Column(String)  # Process whose queue holds the job, see singleflight.OWNER
+    heartbeat_at = Column(DateTime)  # Refreshed by the owner while the job is queued or running
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+class IndexGeneration(Base):
+    __tablename__ = 'index_generations'
+    name = Column(String, primary_key=True)  # Table the in-process index mirrors
+    generation = Column(Integer, nullable=False, default=0)  # Bumped on every change to that table
+
+class TopicResource(Base):
+    __tablename__ = 'topic_resources'
+    topic_id = Column(Integer, ForeignKey('topics.id'), primary_key=True)
+    payload = Column(Text, nullable=False)  # JSON list of trimmed search results
+    fetched_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class TopicResourceAttempt(Base):
+    __tablename__ = 'topic_resource_attempts'
+    topic_id = Column(Integer, ForeignKey('topics.id'), primary_key=True)
+    failures = Column(Integer, nullable=False, default=0)  # Failed searches in a row
+    retry_at = Column(DateTime, nullable=False)  # The refresher leaves the topic alone until then
 
 User.preferences = relationship("UserPreference", back_populates="user", uselist=False)
 User.user_topics = relationship("UserTopic", back_populates="user", cascade="all, delete-orphan")
@@ -0,0 +1,127 @@
+import argparse
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import case, func, insert as sql_insert, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from user_preference import models, schemas
+from user_preference.topic_index import topic_index
+
+
+def upsert_counts_stmt(model, key_columns: list[str], rows: list[dict]):
+    """Adds correct/incorrect counts onto existing aggregate rows, creating them as needed."""
+    stmt = insert(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={
+            "correct_count": model.correct_count + stmt.excluded.correct_count,
+            "incorrect_count": model.incorrect_count + stmt.excluded.incorrect_count,
+        },
+    )
+    return stmt
+
+
+async def record_attempts(db: AsyncSession, user_id: int, answers: list[schemas.UserPerformanceCreate]):
+    """
+    Appends the answers to question_attempts and adds them to the per-topic
+    and per-day aggregates, all in the caller's transaction. Increments happen
+    in SQL, so concurrent submissions don't lose updates. Returns the number
+    of correct and incorrect answers.
+    """
+    if not answers:
+        return 0, 0
+
+    # Resolve every topic in one query
+    names = {answer.topic for answer in answers}
+    topic_ids = await topic_index.resolve(db, names)
+    for answer in answers:
+        if answer.topic not in topic_ids:
+            raise HTTPException(status_code=404, detail=f"Topic {answer.topic} not found")
+
+    # Format and difficulty come from the answered question when the client sent
+    # its id, otherwise from the user's current preferences
+    question_ids = {answer.question_id for answer in answers if answer.question_id is not None}
+    question_meta = {}
+    if question_ids:
+        rows = await db.execute(
+            select(models.Question.id, models.Question.quiz_format, models.Question.difficulty_level)
+            .where(models.Question.id.in_(question_ids))
+        )
+        question_meta = {row.id: (row.quiz_format, row.difficulty_level) for row in rows}
+    preference = (await db.execute(
+        select(models.UserPreference.quiz_format, models.UserPreference.difficulty_level)
+        .where(models.UserPreference.user_id == user_id)
+    )).first()
+    default_meta = (preference.quiz_format, preference.difficulty_level) if preference else (None, None)
+
+    now = datetime.utcnow()
+    attempts = []
+    by_topic = {}
+    for answer in answers:
+        is_correct = answer.is_correct == 'true'
+        quiz_format, difficulty_level = question_meta.get(answer.question_id, default_meta)
+        attempts.append({
+            "user_id": user_id,
+            "question_id": answer.question_id if answer.question_id in question_meta else None,
+            "topic_id": topic_ids[answer.topic],
+            "is_correct": is_correct,
+            "quiz_format": quiz_format,
+            "difficulty_level": difficulty_level,
+            "answered_at": now,
+        })
+        topic_counts = by_topic.setdefault(topic_ids[answer.topic], [0, 0])
+        topic_counts[0 if is_correct else 1] += 1
+
+    correct = sum(counts[0] for counts in by_topic.values())
+    incorrect = len(answers) - correct
+
+    await db.execute(sql_insert(models.QuestionAttempt), attempts)
+    await db.execute(upsert_counts_stmt(models.UserPerformance, ["user_id", "topic_id"], [
+        {"user_id": user_id, "topic_id": topic_id, "correct_count": c, "incorrect_count": i}
+        for topic_id, (c, i) in by_topic.items()
+    ]))
+    await db.execute(upsert_counts_stmt(models.UserDailyPerformance, ["user_id", "day"], [
+        {"user_id": user_id, "day": now.date(), "correct_count": correct, "incorrect_count": incorrect}
+    ]))
+
+    return correct, incorrect
+
+
+def rebuild_aggregates(db: Session):
+    """Recomputes user_performance and user_daily_performance from question_attempts."""
+    correct = func.sum(case((models.QuestionAttempt.is_correct, 1), else_=0))
+    incorrect = func.sum(case((models.QuestionAttempt.is_correct, 0), else_=1))
+
+    db.query(models.UserPerformance).delete(synchronize_session=False)
+    db.execute(
+        sql_insert(models.UserPerformance).from_select(
+            ["user_id", "topic_id", "correct_count", "incorrect_count"],
+            select(models.QuestionAttempt.user_id, models.QuestionAttempt.topic_id, correct, incorrect)
+            .group_by(models.QuestionAttempt.user_id, models.QuestionAttempt.topic_id),
+        )
+    )
+
+    day = func.date(models.QuestionAttempt.answered_at)
+    db.query(models.UserDailyPerformance).delete(synchronize_session=False)
+    db.execute(
+        sql_insert(models.UserDailyPerformance).from_select(
+            ["user_id", "day", "correct_count", "incorrect_count"],
+            select(models.QuestionAttempt.user_id, day, correct, incorrect)
+            .where(models.QuestionAttempt.answered_at.is_not(None))
+            .group_by(models.QuestionAttempt.user_id, day),
+        )
+    )
+    db.commit()
+
+
+if __name__ == "__main__":
+    # python -m user_preference.performance rebuild
+    parser = argparse.ArgumentParser(description="Maintain the performance aggregates")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    from database import SessionLocal
+    with SessionLocal() as session:
+        rebuild_aggregates(session)
+    print("Rebuilt user_performance and user_daily_performance from question_attempts")
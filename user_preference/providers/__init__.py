@@ -0,0 +1,24 @@
+import importlib
+from functools import lru_cache
+from dotenv import load_dotenv
+from config import settings
+
+# Chat models quiz generation can run on, picked with the llm_provider setting
+CHAT_MODELS = ("gemini", "groq", "fake")
+
+
+# Each LLM or search integration lives in its own module here and is imported
+# on first use, so workers that never generate quizzes or look up resources
+# don't pay for loading langchain and the provider SDKs.
+@lru_cache(maxsize=None)
+def load(name: str):
+    # The provider SDKs read their API keys from the environment
+    load_dotenv('.env')
+    return importlib.import_module(f"user_preference.providers.{name}")
+
+
+def create_chat_model(name: str = None):
+    name = name or settings.llm_provider
+    if name not in CHAT_MODELS:
+        raise ValueError(f"Unknown llm_provider {name!r}, expected one of {', '.join(CHAT_MODELS)}")
+    return load(name).create_chat_model()
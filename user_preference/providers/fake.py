@@ -0,0 +1,121 @@
+import asyncio
+import random
+import re
+import time
+import orjson
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+from config import settings
+
+
+class FakeLLMError(Exception):
+    pass
+
+
+def read_prompt(messages) -> dict:
+    """Pulls the quiz parameters back out of the prompt built by create_quiz_prompt."""
+    text = messages[-1].content
+
+    def field(pattern, default):
+        match = re.search(pattern, text)
+        return match.group(1).strip() if match else default
+
+    return {
+        "count": int(field(r"Generate (\d+) quiz questions", "1")),
+        "topics": field(r"- Topics: (.*)", "general").split(", "),
+        "difficulty": field(r"- Difficulty Level: (.*)", "medium"),
+        "quiz_format": field(r"- Quiz Format: (.*)", "MCQs"),
+    }
+
+
+def fake_questions(count: int, topics: list[str], difficulty: str, quiz_format: str, variant: int) -> list[dict]:
+    questions = []
+    for i in range(count):
+        topic = topics[i % len(topics)]
+        if "true" in quiz_format.lower():
+            options = ["true", "false"]
+        else:
+            options = [f"{topic} answer {j}" for j in range(1, 5)]
+        questions.append({
+            "question": f"{difficulty} question {variant}-{i + 1} about {topic}?",
+            "options": options,
+            "correct": options[(variant + i) % len(options)],
+            "topic": topic,
+        })
+    return questions
+
+
+class FakeQuizModel(BaseChatModel):
+    """
+    Offline stand-in for the quiz LLM, for load tests and benchmarks. It reads
+    the prompt, answers after `latency` seconds with valid questions in the
+    JSON array format the real models use, and fails `failure_rate` of the
+    calls. Question wording and injected failures come from a generator seeded
+    with `seed`, so a run with the same settings repeats exactly.
+    """
+
+    latency: float = 0.0
+    failure_rate: float = 0.0
+    seed: int = 0
+    _rng: random.Random = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-quiz"
+
+    def _reply(self, messages):
+        """The reply text and token usage, or the injected error."""
+        fails = self._rng.random() < self.failure_rate
+        prompt = read_prompt(messages)
+        text = orjson.dumps(fake_questions(variant=self._rng.randrange(10 ** 6), **prompt)).decode()
+        # About four characters per token, like the real tokenizers
+        input_tokens, output_tokens = len(messages[-1].content) // 4, len(text) // 4
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                 "total_tokens": input_tokens + output_tokens}
+        return text, usage, FakeLLMError("Injected fake LLM failure") if fails else None
+
+    def _result(self, text, usage):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage, error = self._reply(messages)
+        time.sleep(self.latency)
+        if error:
+            raise error
+        return self._result(text, usage)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage, error = self._reply(messages)
+        await asyncio.sleep(self.latency)
+        if error:
+            raise error
+        return self._result(text, usage)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage, error = self._reply(messages)
+        if error:
+            await asyncio.sleep(self.latency)
+            raise error
+
+        # One chunk per question, with the latency spread over them
+        questions = orjson.loads(text)
+        pieces = ["["] + [orjson.dumps(q).decode() + ("," if i < len(questions) - 1 else "]")
+                          for i, q in enumerate(questions)]
+        for i, piece in enumerate(pieces):
+            await asyncio.sleep(self.latency / len(pieces))
+            last = i == len(pieces) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage if last else None))
+
+
+def create_chat_model():
+    return FakeQuizModel(
+        latency=settings.fake_llm_latency,
+        failure_rate=settings.fake_llm_failure_rate,
+        seed=settings.fake_llm_seed,
+    )
@@ -0,0 +1,11 @@
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+
+def create_chat_model():
+    return ChatGoogleGenerativeAI(
+        model="gemini-1.5-pro",
+        temperature=0.8,
+        max_tokens=None,
+        timeout=None,
+        max_retries=3,
+    )
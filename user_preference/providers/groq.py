@@ -0,0 +1,12 @@
+from langchain_groq import ChatGroq
+from config import settings
+
+
+def create_chat_model():
+    return ChatGroq(
+        model=settings.groq_model,
+        temperature=0.8,
+        max_tokens=None,
+        timeout=None,
+        max_retries=3,
+    )
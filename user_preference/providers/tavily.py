@@ -0,0 +1,13 @@
+from langchain_community.tools import TavilySearchResults
+
+
+def create_search_tool(max_results: int):
+    # Raw page content and images were requested before but never returned to
+    # the client, so they are not fetched
+    return TavilySearchResults(
+        max_results=max_results,
+        search_depth="advanced",
+        include_answer=True,
+        include_raw_content=False,
+        include_images=False,
+    )
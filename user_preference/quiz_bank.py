@@ -0,0 +1,185 @@
+import hashlib
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from user_preference import models
+from user_preference.topic_index import bump_generation, remember_new_topics, topic_index
+from user_preference.schemas import QuizQuestion
+from config import settings
+
+QUIZ_FORMAT_ALIASES = {
+    "mcq": "mcqs",
+    "mcqs": "mcqs",
+    "multiplechoice": "mcqs",
+    "multiple-choice": "mcqs",
+    "true/false": "true/false",
+    "truefalse": "true/false",
+    "true-false": "true/false",
+}
+
+
+def question_hash(question: str, options: list[str], correct: str) -> str:
+    """
+    Identifies a question by its content, ignoring case, extra whitespace and
+    option order, so regenerated copies of a stored question are recognised.
+    """
+    def norm(text):
+        return " ".join(str(text).lower().split())
+
+    parts = [norm(question), "|".join(sorted(norm(option) for option in options)), norm(correct)]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+def normalize_quiz_format(quiz_format: str) -> str:
+    """
+    Maps the free-form quiz format stored in user preferences ("MCQs", "mcqs",
+    "True/False", ...) to the value stored on questions.
+    """
+    fmt = (quiz_format or "").strip().lower().replace(" ", "")
+    return QUIZ_FORMAT_ALIASES.get(fmt, fmt)
+
+
+def recent_questions_query(user_id: int):
+    return (
+        select(models.ServedQuestion.question_id)
+        .where(models.ServedQuestion.user_id == user_id)
+        .order_by(models.ServedQuestion.id.desc())
+        .limit(settings.quiz_recent_window)
+    )
+
+
+async def recently_served_ids(db: AsyncSession, user_id: int) -> set[int]:
+    return set(await db.scalars(recent_questions_query(user_id)))
+
+
+async def pick_bank_questions(db: AsyncSession, user_id: int, topic_ids: list[int], quiz_format: str,
+                        difficulty_level: str, count: int) -> list[tuple[int, QuizQuestion]]:
+    """
+    Picks up to `count` stored questions for the given topics and format, skipping
+    the questions most recently served to the user. Questions are ranked randomly
+    within each topic and taken rank by rank, so the quiz is spread evenly across
+    topics and topics with a small bank are filled up from the others.
+    """
+    if not topic_ids or count <= 0:
+        return []
+
+    recent = recent_questions_query(user_id)
+
+    rank = func.row_number().over(
+        partition_by=models.Question.topic_id, order_by=func.random()
+    ).label("rank")
+    ranked = (
+        select(models.Question.id.label("id"), rank)
+        .where(
+            models.Question.topic_id.in_(topic_ids),
+            models.Question.quiz_format == quiz_format,
+            or_(models.Question.difficulty_level == difficulty_level,
+                models.Question.difficulty_level.is_(None)),
+            models.Question.id.not_in(recent.scalar_subquery()),
+        )
+        .subquery()
+    )
+
+    rows = await db.execute(
+        select(models.Question, models.Topic.name)
+        .join(ranked, ranked.c.id == models.Question.id)
+        .join(models.Topic, models.Topic.id == models.Question.topic_id)
+        .where(ranked.c.rank <= count)
+        .order_by(ranked.c.rank, func.random())
+        .limit(count)
+    )
+
+    return [
+        (
+            question.id,
+            QuizQuestion(
+                question=question.question,
+                options=question.options,
+                correct=question.correct,
+                topic=topic_name,
+            ),
+        )
+        for question, topic_name in rows
+    ]
+
+
+async def resolve_topic_ids(db: AsyncSession, names: set[str]) -> dict[str, int]:
+    """Maps topic names to ids, creating the missing topics in a single upsert."""
+    topic_ids = await topic_index.resolve(db, names)
+    missing = names - topic_ids.keys()
+    if missing:
+        await db.execute(
+            insert(models.Topic).on_conflict_do_nothing(index_elements=["name"]),
+            [{"name": name} for name in missing],
+        )
+        created = dict((await db.execute(
+            select(models.Topic.name, models.Topic.id).where(models.Topic.name.in_(missing))
+        )).all())
+        await bump_generation(db)
+        remember_new_topics(db, created)
+        topic_ids.update(created)
+    return topic_ids
+
+
+async def save_questions(db: AsyncSession, items: list[QuizQuestion], quiz_format: str, difficulty_level: str) -> list[int]:
+    """
+    Stores generated questions in the bank, creating topics the LLM came up
+    with, and returns their ids in order. Questions already in the bank are
+    skipped by the unique content_hash index and their existing ids returned.
+    The caller commits.
+    """
+    if not items:
+        return []
+
+    topic_ids = await resolve_topic_ids(db, {item.topic for item in items})
+    hashes = [question_hash(item.question, item.options, item.correct) for item in items]
+
+    await db.execute(
+        insert(models.Question).on_conflict_do_nothing(index_elements=["content_hash"]),
+        [
+            {
+                "topic_id": topic_ids[item.topic],
+                "question": item.question,
+                "options": item.options,
+                "correct": item.correct,
+                "quiz_format": quiz_format,
+                "difficulty_level": difficulty_level,
+                "content_hash": content_hash,
+            }
+            for item, content_hash in zip(items, hashes)
+        ],
+    )
+
+    question_ids = dict((await db.execute(
+        select(models.Question.content_hash, models.Question.id)
+        .where(models.Question.content_hash.in_(hashes))
+    )).all())
+    return [question_ids[content_hash] for content_hash in hashes]
+
+
+async def record_served(db: AsyncSession, user_id: int, question_ids: list[int]):
+    """
+    Remembers which questions were served to the user and trims the history to
+    the recent window. The caller commits.
+    """
+    if not question_ids:
+        return
+
+    db.add_all([models.ServedQuestion(user_id=user_id, question_id=qid) for qid in question_ids])
+    await db.flush()
+
+    # Drop everything older than the window for this user
+    cutoff = await db.scalar(
+        select(models.ServedQuestion.id)
+        .where(models.ServedQuestion.user_id == user_id)
+        .order_by(models.ServedQuestion.id.desc())
+        .offset(settings.quiz_recent_window)
+        .limit(1)
+    )
+    if cutoff is not None:
+        await db.execute(
+            delete(models.ServedQuestion).where(
+                models.ServedQuestion.user_id == user_id,
+                models.ServedQuestion.id <= cutoff,
+            )
+        )
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from cachetools import TTLCache
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from user_preference import models
+from user_preference.quiz_bank import normalize_quiz_format
+from user_preference.schemas import QuizQuestion
+from config import settings
+
+
+def quiz_fingerprint(topics: list[str], difficulty_level: str, quiz_format: str, number_of_questions: int) -> str:
+    """
+    Builds the cache key for a generated quiz. Topic order, casing and
+    surrounding whitespace don't matter, and quiz format aliases ("MCQs",
+    "mcq", ...) map to the same key.
+    """
+    parts = [
+        "|".join(sorted({topic.strip().lower() for topic in topics})),
+        (difficulty_level or "").strip().lower(),
+        normalize_quiz_format(quiz_format),
+        str(number_of_questions),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+class QuizCache:
+    """
+    Two-tier cache of generated quizzes: a size-bounded LRU with TTL eviction in
+    memory and, when enabled, the quiz_cache table so entries survive restarts.
+    Entries hold the stored question ids together with the quiz items.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, persistent: bool = False, db_ttl: int = 0):
+        self.persistent = persistent
+        self.db_ttl = db_ttl
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    async def get(self, db: AsyncSession, key: str, accept=None):
+        """
+        Returns the (question ids, items) entry for `key`, or None. An entry
+        `accept` turns down is returned as None too, and counted as a miss:
+        only entries that are actually served count as hits.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+        tier = "memory" if entry is not None else None
+
+        if entry is None and self.persistent:
+            row = await db.get(models.QuizCacheEntry, key)
+            if row and row.created_at >= datetime.utcnow() - timedelta(seconds=self.db_ttl):
+                entry = self._decode(row.payload)
+                tier = "db"
+                with self._lock:
+                    self._memory[key] = entry
+
+        if entry is not None and accept is not None and not accept(entry):
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            elif tier == "memory":
+                self.memory_hits += 1
+            else:
+                self.db_hits += 1
+        return entry
+
+    async def set(self, db: AsyncSession, key: str, question_ids: list[int], items: list[QuizQuestion]):
+        """Stores an entry; the caller commits when the persistent tier is on."""
+        entry = (list(question_ids), list(items))
+        with self._lock:
+            self._memory[key] = entry
+
+        if self.persistent:
+            await db.merge(models.QuizCacheEntry(
+                key=key,
+                payload=json.dumps({
+                    "ids": entry[0],
+                    "quiz": [item.model_dump() for item in entry[1]],
+                }),
+                created_at=datetime.utcnow(),
+            ))
+
+    async def invalidate(self, db: AsyncSession, key: str = None):
+        """Drops one entry, or every entry when no key is given; the caller commits."""
+        with self._lock:
+            if key is None:
+                self._memory.clear()
+            else:
+                self._memory.pop(key, None)
+
+        if self.persistent:
+            stmt = delete(models.QuizCacheEntry)
+            if key is not None:
+                stmt = stmt.where(models.QuizCacheEntry.key == key)
+            await db.execute(stmt)
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "size": len(self._memory),
+                "maxsize": self._memory.maxsize,
+                "persistent": self.persistent,
+            }
+
+    @staticmethod
+    def _decode(payload: str):
+        data = json.loads(payload)
+        return data["ids"], [QuizQuestion(**item) for item in data["quiz"]]
+
+
+quiz_cache = QuizCache(
+    maxsize=settings.quiz_cache_size,
+    ttl=settings.quiz_cache_ttl,
+    persistent=settings.quiz_cache_persistent,
+    db_ttl=settings.quiz_cache_db_ttl,
+)
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import random
+from functools import lru_cache
+from user_preference import providers
+from user_preference.schemas import Quiz
+from user_preference.quiz_parser import JsonObjectStream, parse_object, parse_quiz_output, message_text
+from config import settings
+import metrics
+
+logger = logging.getLogger(__name__)
+
+def create_quiz_prompt():
+    from langchain_core.prompts import PromptTemplate  # Loaded with the first quiz, not at startup
+
+    prompt_template = PromptTemplate(
+        input_variables=["number_of_questions", "topics", "difficulty_level", "quiz_format"],
+        template="""
+
+            Generate {number_of_questions} quiz questions based on the following user preferences:
+            - Topics: {topics}
+            - Difficulty Level: {difficulty_level}
+            - Quiz Format: {quiz_format}
+
+            If the quiz format is "MCQs", provide questions with four answer options, where one is the correct answer.
+
+            If the quiz format is "True/False", provide questions with two options: "true" and "false".
+
+            Return the output as a JSON array, where each object contains:
+            - "question": The quiz question text.
+            - "options": An array of answer options.
+            - "correct": The correct answer.
+            - "topic": The topic the question belongs to, which should be from the list of user-defined topics.
+
+            Example response for MCQs:
+            [
+                {{
+                    "question": "What is the correct machine learning type from the below options?",
+                    "options": ["supervised learning", "AI learning", "computer learning", "science learning"],
+                    "correct": "supervised learning",
+                    "topic": "machine learning"
+                }},
+                {{
+                    "question": "What does GPT stand for?",
+                    "options": ["General Processing Tensor", "Generative Pretrained Transformer", "Graphics Processing Temperature", "Generative Pretrained Transformer"],
+                    "correct": "Generative Pretrained Transformer",
+                    "topic": "AI"
+                }}
+            ]
+
+            Example response for True/False:
+            [
+                {{
+                    "question": "Is regression a type of supervised machine learning?",
+                    "options": ["true", "false"],
+                    "correct": "true",
+                    "topic": "machine learning"
+                }},
+                {{
+                    "question": "Is classification a type of unsupervised machine learning?",
+                    "options": ["true", "false"],
+                    "correct": "false",
+                    "topic": "AI"
+                }}
+            ]
+
+            Generate questions based on the user input now.
+            """
+        )
+    
+    return prompt_template  # Return the PromptTemplate object, not the formatted string
+
+
+# Initialize LLM once per process; the client keeps its connections open between requests
+@lru_cache(maxsize=1)
+def get_openai_llm():
+    return providers.create_chat_model()
+
+# The prompt -> LLM chain is stateless, so it is built once and shared. Its raw
+# output goes through parse_quiz_output, which keeps whatever questions are valid
+@lru_cache(maxsize=1)
+def get_quiz_chain():
+    return create_quiz_prompt() | get_openai_llm()
+
+# Caps the number of LLM calls this process has in flight at once
+_llm_slots = None
+
+def get_llm_slots():
+    global _llm_slots
+    if _llm_slots is None:
+        _llm_slots = asyncio.Semaphore(settings.llm_max_concurrency)
+    return _llm_slots
+
+def build_prompt_values(preferences, topics, number_of_questions):
+    return {
+        "number_of_questions": number_of_questions,
+        "topics": ", ".join([t for t in topics]),  # Format topics into a string
+        "difficulty_level": preferences.difficulty_level,
+        "quiz_format": preferences.quiz_format
+    }
+
+def split_questions(topics, number_of_questions):
+    """
+    Spreads the questions over the topics as evenly as possible, e.g. 5 questions
+    over 3 topics -> [(t1, 2), (t2, 2), (t3, 1)]. Topics that get no question are left out.
+    """
+    base, extra = divmod(number_of_questions, len(topics))
+    shares = [(topic, base + (1 if i < extra else 0)) for i, topic in enumerate(topics)]
+    return [(topic, share) for topic, share in shares if share > 0]
+
+def collect_questions(result, topics):
+    if result.rejects:
+        logger.warning("Dropped %d malformed quiz question(s) for %s", len(result.rejects), ", ".join(topics))
+    return result.questions
+
+# Questions the parser had to drop are re-requested in small top-up calls
+# rather than a full retry
+async def agenerate_topic_questions(chain, preferences, topic, number_of_questions):
+    questions = []
+    for _ in range(settings.quiz_topup_attempts + 1):
+        missing = number_of_questions - len(questions)
+        if missing <= 0:
+            break
+        async with get_llm_slots():
+            async with metrics.atimed("llm"):
+                message = await chain.ainvoke(build_prompt_values(preferences, [topic], missing))
+        metrics.record_tokens(message)
+        questions.extend(collect_questions(parse_quiz_output(message_text(message)), [topic]))
+
+    return questions[:number_of_questions]
+
+# Async variant: each topic's share of the quiz is generated by its own LLM call,
+# all running concurrently, so the quiz takes about as long as one short call
+async def agenerate_quiz_with_langchain(preferences, topics, number_of_questions=settings.quiz_length):
+    chain = get_quiz_chain()
+
+    # Shuffle so that, with more topics than questions, different topics get picked each time
+    topics = random.sample(topics, len(topics))
+    outputs = await asyncio.gather(*(
+        agenerate_topic_questions(chain, preferences, topic, share)
+        for topic, share in split_questions(topics, number_of_questions)
+    ))
+
+    return Quiz(root=[item for output in outputs for item in output])
+
+# Streaming variant: yields each question as soon as its JSON object has been
+# written by the LLM and validates, instead of waiting for the whole array
+async def stream_quiz_objects(chain, prompt_values, topics, questions: asyncio.Queue):
+    """
+    Streams the model's reply into `questions`, one parsed question at a time,
+    ending with None. Holds an LLM slot only while the model is writing, not
+    while the consumer stores what it was given.
+    """
+    objects = JsonObjectStream()
+    rejects = 0
+    try:
+        async with get_llm_slots(), metrics.atimed("llm"):
+            async for chunk in chain.astream(prompt_values):
+                metrics.record_tokens(chunk)
+                for text in objects.feed(message_text(chunk)):
+                    parsed, rejected = parse_object(text)
+                    rejects += len(rejected)
+                    for item in parsed:
+                        questions.put_nowait(item)
+
+        if objects.pending:
+            parsed, rejected = parse_object(objects.pending)
+            rejects += len(rejected)
+            for item in parsed:
+                questions.put_nowait(item)
+
+        if rejects:
+            logger.warning("Dropped %d malformed streamed quiz question(s) for %s", rejects, ", ".join(topics))
+    finally:
+        questions.put_nowait(None)
+
+
+async def astream_quiz_questions(preferences, topics, number_of_questions=settings.quiz_length):
+    questions = asyncio.Queue()
+    producer = asyncio.create_task(stream_quiz_objects(
+        get_quiz_chain(), build_prompt_values(preferences, topics, number_of_questions), topics, questions
+    ))
+    try:
+        while (item := await questions.get()) is not None:
+            yield item
+        # Raises whatever ended the model stream
+        await producer
+    finally:
+        # The consumer stopped early: don't leave the model writing for nobody
+        if not producer.done():
+            producer.cancel()
@@ -0,0 +1,118 @@
+from pydantic import BaseModel, ValidationError
+from user_preference.schemas import QuizQuestion
+
+
+class JsonObjectStream:
+    """
+    Splits streamed LLM text into the top-level JSON objects it contains, as
+    soon as each one is complete. Anything outside an object (the enclosing
+    array brackets, commas, markdown fences, chatter) is skipped, and braces
+    inside strings are ignored.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> list[str]:
+        objects = []
+        for ch in text:
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._buffer = [ch]
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    objects.append("".join(self._buffer))
+                    self._buffer = []
+        return objects
+
+    @property
+    def pending(self):
+        """The unfinished object at the end of the text so far, if any (e.g. a truncated reply)."""
+        return "".join(self._buffer) if self._depth else None
+
+
+def parse_question(text: str):
+    """Validates one JSON object as a QuizQuestion, returning None if it isn't one."""
+    try:
+        return QuizQuestion.model_validate_json(text)
+    except ValidationError:
+        return None
+
+
+def parse_object(raw: str) -> tuple[list[QuizQuestion], list[str]]:
+    """
+    Validates one JSON object as a QuizQuestion. An object that isn't one is
+    searched for question objects nested in it, so wrappers such as
+    {"questions": [...]} still yield their questions. Also given the unfinished
+    tail of a reply: a reply cut off inside a wrapper object may still hold
+    complete questions. Returns the questions and the raw parts that had to be
+    rejected.
+    """
+    item = parse_question(raw)
+    if item is not None:
+        return [item], []
+
+    # Skip the object's own opening brace, so its nested objects are the top level
+    inner = JsonObjectStream()
+    questions, rejects = [], []
+    for nested in inner.feed(raw[1:]):
+        found, rejected = parse_object(nested)
+        questions.extend(found)
+        rejects.extend(rejected)
+    if not questions:
+        return [], [raw]
+    if inner.pending:
+        rejects.append(inner.pending)
+    return questions, rejects
+
+
+class QuizParseResult(BaseModel):
+    questions: list[QuizQuestion] = []
+    rejects: list[str] = []  # Raw objects that failed validation, and any truncated tail
+
+
+def parse_quiz_output(text: str) -> QuizParseResult:
+    """
+    Lenient replacement for PydanticOutputParser(pydantic_object=Quiz): finds the
+    question objects wherever they are in the reply (inside markdown fences,
+    followed by extra text, wrapped in an object, cut off at the end),
+    validates each one on its own and keeps every valid question instead of
+    failing the whole reply.
+    """
+    objects = JsonObjectStream()
+    result = QuizParseResult()
+    raws = objects.feed(text)
+    if objects.pending:
+        raws.append(objects.pending)
+    for raw in raws:
+        questions, rejects = parse_object(raw)
+        result.questions.extend(questions)
+        result.rejects.extend(rejects)
+    return result
+
+
+def message_text(message) -> str:
+    """Text of an LLM message or chunk; some providers return a list of content parts."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
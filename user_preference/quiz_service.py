@@ -0,0 +1,182 @@
+import json
+import logging
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from user_preference import models, schemas, quiz_bank
+from user_preference.quiz_generation import agenerate_quiz_with_langchain, astream_quiz_questions
+from user_preference.quiz_cache import quiz_cache, quiz_fingerprint
+from user_preference.singleflight import quiz_flights
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def unseen_by(seen_ids: set[int]):
+    """Accepts a cached quiz only if none of its questions are in `seen_ids`."""
+    return lambda entry: not set(entry[0]) & seen_ids
+
+
+async def lookup_cached_quiz(cache_key, seen_ids: set[int]):
+    async with AsyncSessionLocal() as session:
+        return await quiz_cache.get(session, cache_key, accept=unseen_by(seen_ids))
+
+
+# The shared part of a generation: only the LLM call, so requests waiting on
+# it hold no database connection. Returns an entry without ids; each caller
+# stores the questions on its own session (see store_generated_quiz)
+async def generate_quiz_items(difficulty_level, quiz_format, topic_names, number_of_questions):
+    preferences = schemas.QuizPreferences(difficulty_level=difficulty_level, quiz_format=quiz_format)
+    quiz_output = await agenerate_quiz_with_langchain(preferences, topic_names, number_of_questions)
+    return None, quiz_output.root
+
+
+async def store_generated_quiz(db: AsyncSession, cache_key, items, quiz_format, difficulty_level):
+    """
+    Saves generated questions in the bank and the cache, returning their ids.
+    Callers that shared a generation all run it; save_questions skips the
+    copies already stored and returns the same ids. The caller commits.
+    """
+    question_ids = await quiz_bank.save_questions(db, items, quiz_format, difficulty_level)
+    # With the bank first build_quiz never reads the cache; only other workers
+    # waiting on a cross-worker generation look there
+    if not settings.quiz_bank_first or quiz_flights.cross_worker:
+        await quiz_cache.set(db, cache_key, question_ids, items)
+    return question_ids
+
+
+async def get_quiz_preferences(db: AsyncSession, user_id: int):
+    """Returns the user's preferences and their (id, name) topics, or raises a 404."""
+    # Fetch user preferences from the database
+    preferences = await db.scalar(select(models.UserPreference).where(models.UserPreference.user_id == user_id))
+    if not preferences:
+        raise HTTPException(status_code=404, detail="User preferences not found")
+    
+    # Fetch topics selected by the user by joining UserTopic and Topic tables
+    topics = (await db.execute(
+        select(models.Topic.id, models.Topic.name).join(models.UserTopic).where(models.UserTopic.user_id == user_id)
+    )).all()
+    
+    if not topics:
+        raise HTTPException(status_code=404, detail="User topics not found")
+
+    return preferences, topics
+
+
+def served_question(question_id: int, item: schemas.QuizQuestion) -> schemas.ServedQuizQuestion:
+    return schemas.ServedQuizQuestion(id=question_id, **item.model_dump())
+
+
+async def build_quiz(db: AsyncSession, user_id: int) -> list[schemas.ServedQuizQuestion]:
+    """
+    Builds a quiz for the user from their preferences: stored questions first,
+    then cached or freshly generated ones for the rest. Records what was served.
+    """
+    preferences, topics = await get_quiz_preferences(db, user_id)
+
+    topic_ids = [topic.id for topic in topics]
+    topic_names = [topic.name for topic in topics]
+    quiz_format = quiz_bank.normalize_quiz_format(preferences.quiz_format)
+
+    # Serve as much of the quiz as possible from previously generated questions
+    served = []
+    if settings.quiz_bank_first:
+        served = await quiz_bank.pick_bank_questions(
+            db, user_id, topic_ids, quiz_format, preferences.difficulty_level, settings.quiz_length
+        )
+    served_ids = [question_id for question_id, _ in served]
+    quiz_data = [item for _, item in served]
+
+    # Only ask the LLM for what the bank couldn't cover
+    missing = settings.quiz_length - len(quiz_data)
+    if missing > 0:
+        cache_key = quiz_fingerprint(topic_names, preferences.difficulty_level, quiz_format, missing)
+        # A cached quiz is only reused if this user hasn't just been shown it
+        seen_ids = await quiz_bank.recently_served_ids(db, user_id) | set(served_ids)
+        cached = None
+        # Cached questions are in the bank too, so with the bank first they were
+        # either just picked or recently served; the cache can only add to it without
+        if not settings.quiz_bank_first:
+            cached = await quiz_cache.get(db, cache_key, accept=unseen_by(seen_ids))
+
+        if cached is None:
+            # Nothing is written yet: ending the transaction hands the connection
+            # back to the pool for the LLM wait, the session takes a new one after
+            await db.commit()
+            # Identical requests arriving together share a single generation;
+            # another worker's result is only taken if this user hasn't seen it
+            cached = await quiz_flights.do(
+                cache_key,
+                lambda: generate_quiz_items(
+                    preferences.difficulty_level, preferences.quiz_format, topic_names, missing
+                ),
+                recheck=lambda: lookup_cached_quiz(cache_key, seen_ids),
+            )
+        cached_ids, cached_items = cached
+        if cached_ids is None:
+            cached_ids = await store_generated_quiz(
+                db, cache_key, cached_items, quiz_format, preferences.difficulty_level
+            )
+
+        served_ids.extend(cached_ids)
+        quiz_data.extend(cached_items)
+
+    await quiz_bank.record_served(db, user_id, served_ids)
+    await db.commit()
+
+    return [served_question(question_id, item) for question_id, item in zip(served_ids, quiz_data)]
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_quiz(user_id: int, preferences: schemas.QuizPreferences, topics):
+    """
+    Server-Sent Events version of build_quiz. Stored questions are sent first,
+    then each generated question is stored and sent as soon as the LLM has
+    finished writing it. Ends with a "done" event, or an "error" event.
+    """
+    topic_ids = [topic.id for topic in topics]
+    topic_names = [topic.name for topic in topics]
+    quiz_format = quiz_bank.normalize_quiz_format(preferences.quiz_format)
+
+    async with AsyncSessionLocal() as db:
+        served_ids = []
+        try:
+            if settings.quiz_bank_first:
+                served = await quiz_bank.pick_bank_questions(
+                    db, user_id, topic_ids, quiz_format, preferences.difficulty_level, settings.quiz_length
+                )
+                for question_id, item in served:
+                    served_ids.append(question_id)
+                    yield sse_event("question", served_question(question_id, item).model_dump())
+
+            missing = settings.quiz_length - len(served_ids)
+            if missing > 0:
+                async for item in astream_quiz_questions(preferences, topic_names, missing):
+                    question_ids = await quiz_bank.save_questions(db, [item], quiz_format, preferences.difficulty_level)
+                    served_ids.extend(question_ids)
+                    await db.commit()
+                    yield sse_event("question", served_question(question_ids[0], item).model_dump())
+                    missing -= 1
+                    if missing == 0:
+                        break
+
+            # Top up whatever the stream lost to malformed or truncated output
+            if missing > 0:
+                quiz_output = await agenerate_quiz_with_langchain(preferences, topic_names, missing)
+                for item in quiz_output.root:
+                    question_ids = await quiz_bank.save_questions(db, [item], quiz_format, preferences.difficulty_level)
+                    served_ids.extend(question_ids)
+                    await db.commit()
+                    yield sse_event("question", served_question(question_ids[0], item).model_dump())
+
+            await quiz_bank.record_served(db, user_id, served_ids)
+            await db.commit()
+            yield sse_event("done", {"count": len(served_ids)})
+        except Exception:
+            logger.exception("Streaming quiz for user %s failed", user_id)
+            await db.rollback()
+            yield sse_event("error", {"detail": "Quiz generation failed"})
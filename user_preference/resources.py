@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from functools import lru_cache
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from user_preference import models, providers
+from user_preference.singleflight import release_lock, renew_lock, try_acquire_lock
+from config import settings
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# generation_locks row held by the one worker elected to run the refresher
+REFRESHER_LOCK = "resource_refresher"
+
+_refresher: asyncio.Task = None
+_wake: asyncio.Event = None
+
+
+def generate_tavily_prompt(topic_name: str) -> str:
+    """
+    Generates a Tavily search prompt based on the topic name.
+    """
+    return f"Find top learning resources for {topic_name}. The resources should include tutorials, articles, videos, and courses that help improve understanding and skills in {topic_name}. Focus on beginner to intermediate level materials, emphasizing practical examples and hands-on learning."
+
+
+# One tool for every lookup
+@lru_cache
+def get_search_tool():
+    return providers.load("tavily").create_search_tool(max_results=settings.resource_max_results)
+
+
+def trim_results(results: list[dict]) -> list[dict]:
+    """Keeps the url and a bounded snippet of each search result."""
+    return [
+        {"url": result["url"], "content": (result.get("content") or "")[:settings.resource_snippet_chars]}
+        for result in results
+        if result.get("url")
+    ]
+
+
+# Caps the number of Tavily searches this process has in flight at once
+_search_slots = None
+
+def get_search_slots():
+    global _search_slots
+    if _search_slots is None:
+        _search_slots = asyncio.Semaphore(settings.resource_max_concurrency)
+    return _search_slots
+
+
+async def fetch_topic_resources(topic_name: str):
+    """Runs the Tavily search for one topic. Returns the trimmed results, or None if it failed."""
+    async with get_search_slots(), metrics.atimed("tavily"):
+        response = await get_search_tool().ainvoke({"query": generate_tavily_prompt(topic_name)})
+
+    # The tool reports API errors as a string instead of raising
+    if not isinstance(response, list):
+        logger.warning("Resource search for %s failed: %s", topic_name, response)
+        return None
+    return trim_results(response)
+
+
+async def load_topic_resources(db: AsyncSession, topic_ids: list[int]) -> dict[int, list[dict]]:
+    """Reads the stored resources of the given topics; topics not fetched yet are left out."""
+    rows = await db.execute(
+        select(models.TopicResource.topic_id, models.TopicResource.payload)
+        .where(models.TopicResource.topic_id.in_(topic_ids))
+    )
+    return {topic_id: json.loads(payload) for topic_id, payload in rows}
+
+
+def stale_topics_query(limit: int):
+    """
+    Topics whose resources were never fetched or are older than
+    resource_refresh_after, leaving out topics whose last search failed until
+    their retry time. Topics that are weak (under 90% accuracy) for the most
+    users come first, then the ones never fetched, then the oldest.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.resource_refresh_after)
+    attempts = models.UserPerformance.correct_count + models.UserPerformance.incorrect_count
+    weak_users = (
+        select(
+            models.UserPerformance.topic_id,
+            func.sum(case((models.UserPerformance.correct_count * 100 < attempts * 90, 1), else_=0)).label("weak"),
+        )
+        .where(attempts > 0)
+        .group_by(models.UserPerformance.topic_id)
+        .subquery()
+    )
+    return (
+        select(models.Topic.id, models.Topic.name, func.coalesce(models.TopicResourceAttempt.failures, 0).label("failures"))
+        .outerjoin(models.TopicResource, models.TopicResource.topic_id == models.Topic.id)
+        .outerjoin(models.TopicResourceAttempt, models.TopicResourceAttempt.topic_id == models.Topic.id)
+        .outerjoin(weak_users, weak_users.c.topic_id == models.Topic.id)
+        .where(models.TopicResource.fetched_at.is_(None) | (models.TopicResource.fetched_at < cutoff))
+        .where(models.TopicResourceAttempt.retry_at.is_(None) | (models.TopicResourceAttempt.retry_at <= now))
+        .order_by(func.coalesce(weak_users.c.weak, 0).desc(), models.TopicResource.fetched_at)
+        .limit(limit)
+    )
+
+
+async def refresh_stale_topics(limit: int = None) -> int:
+    """Searches one batch of stale topics concurrently and stores the results. Returns how many were searched."""
+    async with AsyncSessionLocal() as db:
+        topics = (await db.execute(stale_topics_query(limit or settings.resource_refresh_batch))).all()
+        if not topics:
+            return 0
+
+        results = await asyncio.gather(*[fetch_topic_resources(topic.name) for topic in topics])
+        now = datetime.utcnow()
+        rows = [
+            {"topic_id": topic.id, "payload": json.dumps(resources), "fetched_at": now}
+            for topic, resources in zip(topics, results)
+            if resources is not None
+        ]
+        # Failed topics back off, so they can't take every pass's batch
+        failures = [
+            {
+                "topic_id": topic.id,
+                "failures": topic.failures + 1,
+                "retry_at": now + timedelta(seconds=min(settings.resource_retry_after * 2 ** topic.failures,
+                                                        settings.resource_refresh_after)),
+            }
+            for topic, resources in zip(topics, results)
+            if resources is None
+        ]
+        if rows:
+            stmt = insert(models.TopicResource)
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["topic_id"],
+                    set_={"payload": stmt.excluded.payload, "fetched_at": stmt.excluded.fetched_at},
+                ),
+                rows,
+            )
+            await db.execute(delete(models.TopicResourceAttempt).where(
+                models.TopicResourceAttempt.topic_id.in_([row["topic_id"] for row in rows])
+            ))
+        if failures:
+            stmt = insert(models.TopicResourceAttempt)
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["topic_id"],
+                    set_={"failures": stmt.excluded.failures, "retry_at": stmt.excluded.retry_at},
+                ),
+                failures,
+            )
+        await db.commit()
+        return len(topics)
+
+
+async def is_elected() -> bool:
+    """Keeps or takes the refresher role; only one worker holds it at a time."""
+    return (await renew_lock(REFRESHER_LOCK, settings.resource_refresher_lease)
+            or await try_acquire_lock(REFRESHER_LOCK, settings.resource_refresher_lease))
+
+
+async def refresher():
+    while True:
+        try:
+            # Keep going while full batches come back, then wait for the next pass
+            while await is_elected() and await refresh_stale_topics() >= settings.resource_refresh_batch:
+                pass
+        except Exception:
+            logger.exception("Refreshing topic resources failed")
+
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=settings.resource_refresh_interval)
+        except asyncio.TimeoutError:
+            pass
+        _wake.clear()
+
+
+def request_refresh():
+    """Wakes the refresher early, e.g. when a user asked for a topic that has no resources yet."""
+    if _wake is not None:
+        _wake.set()
+
+
+def start_refresher():
+    """Starts the background refresher on the running event loop. Safe to call more than once."""
+    global _refresher, _wake
+    if _refresher is not None or not settings.resource_refresher_enabled:
+        return
+    _wake = asyncio.Event()
+    _refresher = asyncio.create_task(refresher())
+
+
+async def stop_refresher():
+    global _refresher, _wake
+    if _refresher is None:
+        return
+    _refresher.cancel()
+    await asyncio.gather(_refresher, return_exceptions=True)
+    _refresher = None
+    _wake = None
+    # Lets another worker take over without waiting for the lease to run out
+    await release_lock(REFRESHER_LOCK)
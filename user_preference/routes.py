@@ -1,72 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from user_preference import models, schemas
-from accounts import auth
-from database import SessionLocal
-from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_groq import ChatGroq
-import getpass
-import os
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-import json
-from pydantic import BaseModel,RootModel
-from langchain.output_parsers import PydanticOutputParser
-from langchain_community.tools import TavilySearchResults
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import case, delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from user_preference import models, schemas, jobs, performance, resources
+from accounts.dependencies import get_admin_user, get_current_user
+from accounts.schemas import CurrentUser
+from database import ReadSessionLocal, get_db, get_read_db
+import orjson
+from typing import List
+from user_preference.quiz_cache import quiz_cache
+from user_preference.topic_index import bump_generation, topic_index
+from user_preference.quiz_service import build_quiz, get_quiz_preferences, stream_quiz
+from config import settings
 
 # "mcqs","true/false"
 
-# Load environment variables from .env file
-load_dotenv('.env')
-
 router = APIRouter()
 
-# OAuth2 scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
-
-# Dependency for database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# Dependency to get current user from JWT
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=401,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
-
-
 @router.post("/preferences", response_model=schemas.UserPreferenceResponse)
-def create_or_update_user_preference(
+async def create_or_update_user_preference(
     preference: schemas.UserPreferenceCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     # Check if the user already has a preference
-    existing_preference = db.query(models.UserPreference).filter_by(user_id=current_user.id).first()
+    existing_preference = await db.scalar(select(models.UserPreference).filter_by(user_id=current_user.id))
 
     # Ensure topics exist
-    topics = db.query(models.Topic).filter(models.Topic.id.in_(preference.topics)).all()
+    topics = (await db.scalars(select(models.Topic).where(models.Topic.id.in_(preference.topics)))).all()
     if len(topics) != len(preference.topics):
         raise HTTPException(status_code=400, detail="One or more topics not found")
 
@@ -84,16 +45,16 @@ def create_or_update_user_preference(
         db.add(existing_preference)
 
     # Commit changes to preferences
-    db.commit()
-    db.refresh(existing_preference)
+    await db.commit()
+    await db.refresh(existing_preference)
 
     # Clear existing user topics and add new ones
-    db.query(models.UserTopic).filter_by(user_id=current_user.id).delete()
+    await db.execute(delete(models.UserTopic).filter_by(user_id=current_user.id))
     for topic_id in preference.topics:
         user_topic = models.UserTopic(user_id=current_user.id, topic_id=topic_id)
         db.add(user_topic)
 
-    db.commit()
+    await db.commit()
 
     # Fetch assigned topics to return in response
     existing_preference.topics = topics
@@ -102,297 +63,198 @@ def create_or_update_user_preference(
 
 # Get user preferences
 @router.get("/preferences", response_model=schemas.UserPreferenceResponse)
-def get_user_preference(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    user_pref = db.query(models.UserPreference).filter(models.UserPreference.user_id == current_user.id).first()
+async def get_user_preference(db: AsyncSession = Depends(get_read_db), current_user: CurrentUser = Depends(get_current_user)):
+    user_pref = await db.scalar(select(models.UserPreference).where(models.UserPreference.user_id == current_user.id))
     if not user_pref:
         raise HTTPException(status_code=404, detail="User preferences not found")
 
-    topics = db.query(models.Topic).join(models.UserTopic).filter(models.UserTopic.user_id == current_user.id).all()
+    topics = (await db.scalars(
+        select(models.Topic).join(models.UserTopic).where(models.UserTopic.user_id == current_user.id)
+    )).all()
     user_pref.topics = topics
 
     return user_pref
 
 # Create a new topic
 @router.post("/topics", response_model=schemas.TopicResponse)
-def create_topic(topic: schemas.TopicCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+async def create_topic(topic: schemas.TopicCreate, db: AsyncSession = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
     # Ensure the topic does not already exist
-    existing_topic = db.query(models.Topic).filter(models.Topic.name == topic.name).first()
-    if existing_topic:
+    if await topic_index.get_id(db, topic.name) is not None:
         raise HTTPException(status_code=400, detail="Topic already exists")
 
     # Create the new topic
     new_topic = models.Topic(name=topic.name)
     db.add(new_topic)
-    db.commit()
-    db.refresh(new_topic)
+    await bump_generation(db)
+    await db.commit()
+    await db.refresh(new_topic)
+    topic_index.add({new_topic.name: new_topic.id})
 
     return new_topic
 
 @router.put("/preferences", response_model=schemas.UserPreferenceResponse)
-def update_user_preference(preference: schemas.UserPreferenceCreate, 
-                           db: Session = Depends(get_db), 
-                           current_user: models.User = Depends(get_current_user)):
+async def update_user_preference(preference: schemas.UserPreferenceCreate, 
+                                 db: AsyncSession = Depends(get_db), 
+                                 current_user: CurrentUser = Depends(get_current_user)):
     # Fetch existing preference
-    user_pref = db.query(models.UserPreference).filter_by(user_id=current_user.id).first()
+    user_pref = await db.scalar(select(models.UserPreference).filter_by(user_id=current_user.id))
     if not user_pref:
         raise HTTPException(status_code=404, detail="User preferences not found")
 
     # Ensure topics exist
-    topics = db.query(models.Topic).filter(models.Topic.id.in_(preference.topics)).all()
+    topics = (await db.scalars(select(models.Topic).where(models.Topic.id.in_(preference.topics)))).all()
     if len(topics) != len(preference.topics):
         raise HTTPException(status_code=400, detail="One or more topics not found")
 
     # Update preference fields
     user_pref.difficulty_level = preference.difficulty_level
     user_pref.quiz_format = preference.quiz_format
-    db.commit()
+    await db.commit()
 
     # Update topics for the user
     # First, delete old topics
-    db.query(models.UserTopic).filter_by(user_id=current_user.id).delete()
-    db.commit()
+    await db.execute(delete(models.UserTopic).filter_by(user_id=current_user.id))
+    await db.commit()
 
     # Now, add new topics
     for topic_id in preference.topics:
         user_topic = models.UserTopic(user_id=current_user.id, topic_id=topic_id)
         db.add(user_topic)
-    db.commit()
+    await db.commit()
 
     # Fetch assigned topics to return in response
     user_pref.topics = topics
 
     return user_pref
 
-class QuizQuestion(BaseModel):
-    question: str
-    options: list[str]
-    correct: str
-    topic : str
-
-class Quiz(RootModel):
-    root: list[QuizQuestion]
-
-# Set up the PydanticOutputParser to parse quiz data into the expected format
-parser = PydanticOutputParser(pydantic_object=Quiz)
-
-def create_quiz_prompt():
-    prompt_template = PromptTemplate(
-        input_variables=["number_of_questions", "topics", "difficulty_level", "quiz_format"],
-        template="""
-
-            Generate {number_of_questions} quiz questions based on the following user preferences:
-            - Topics: {topics}
-            - Difficulty Level: {difficulty_level}
-            - Quiz Format: {quiz_format}
-
-            If the quiz format is "MCQs", provide questions with four answer options, where one is the correct answer.
-
-            If the quiz format is "True/False", provide questions with two options: "true" and "false".
-
-            Return the output as a JSON array, where each object contains:
-            - "question": The quiz question text.
-            - "options": An array of answer options.
-            - "correct": The correct answer.
-            - "topic": The topic the question belongs to, which should be from the list of user-defined topics.
-
-            Example response for MCQs:
-            [
-                {{
-                    "question": "What is the correct machine learning type from the below options?",
-                    "options": ["supervised learning", "AI learning", "computer learning", "science learning"],
-                    "correct": "supervised learning",
-                    "topic": "machine learning"
-                }},
-                {{
-                    "question": "What does GPT stand for?",
-                    "options": ["General Processing Tensor", "Generative Pretrained Transformer", "Graphics Processing Temperature", "Generative Pretrained Transformer"],
-                    "correct": "Generative Pretrained Transformer",
-                    "topic": "AI"
-                }}
-            ]
-
-            Example response for True/False:
-            [
-                {{
-                    "question": "Is regression a type of supervised machine learning?",
-                    "options": ["true", "false"],
-                    "correct": "true",
-                    "topic": "machine learning"
-                }},
-                {{
-                    "question": "Is classification a type of unsupervised machine learning?",
-                    "options": ["true", "false"],
-                    "correct": "false",
-                    "topic": "AI"
-                }}
-            ]
-
-            Generate questions based on the user input now.
-            """
-                            
-        ,partial_variables={"format_instructions": parser.get_format_instructions()})
-    
-    return prompt_template  # Return the PromptTemplate object, not the formatted string
-
-
-# Initialize LLM
-def get_openai_llm():
-    llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-pro",
-    temperature=0.8,
-    max_tokens=None,
-    timeout=None,
-    max_retries=3,
-    # other params...
-)
-    return llm
-
-# Function to generate the quiz using LangChain
-def generate_quiz_with_langchain(preferences, topics):
-    # Initialize OpenAI LLM
-    llm = get_openai_llm()
-
-    # Create the LangChain LLM chain with a proper PromptTemplate object
-    prompt_template = create_quiz_prompt()
-    
-    # Create the LLMChain to process the prompt and parse the response
-    chain = prompt_template | llm | parser
-
-    # Generate the prompt values dynamically
-    prompt_values = {
-        "number_of_questions": 5,
-        "topics": ", ".join([t for t in topics]),  # Format topics into a string
-        "difficulty_level": preferences.difficulty_level,
-        "quiz_format": preferences.quiz_format
+def quiz_item(row, topic_name: str) -> dict:
+    return {
+        "question": row.question,
+        "options": row.options,
+        "correct": row.correct,
+        "topic": topic_name
     }
 
-    # Run the chain with the prompt values
-    quiz_output = chain.invoke(prompt_values)
-
-    return quiz_output
-
+async def stream_ndjson(stmt, to_dict):
+    """
+    Yields one JSON line per row, reading the rows from a server-side cursor in
+    batches so memory stays flat however many rows match. Uses a session of its
+    own, since the response outlives the request's dependencies.
+    """
+    async with ReadSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=settings.stream_batch_size))
+        async for row in result:
+            yield orjson.dumps(to_dict(row)) + b"\n"
+
+def keyset_page(rows, limit: int):
+    """Trims a limit + 1 row fetch to the page; returns it with an X-Next-Cursor header when there is more."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, {"X-Next-Cursor": str(rows[-1].id)}
+    return rows, {}
+
+# Questions are returned in id order, `limit` at a time; pass the X-Next-Cursor
+# header back as after_id for the next page, or stream=true for NDJSON
 @router.get("/quiz-by-topic/")
-def get_quiz_by_topic(topic_name: str, db: Session = Depends(get_db)):
-    # Fetch the topic by name
-    topic = db.query(models.Topic).filter(models.Topic.name == topic_name).first()
+async def get_quiz_by_topic(topic_name: str,
+                            after_id: int = Query(0, ge=0),
+                            limit: int = Query(settings.page_size_default, ge=1, le=settings.page_size_max),
+                            stream: bool = False,
+                            db: AsyncSession = Depends(get_read_db)):
+    # Resolve the topic through the in-process index
+    topic_id = await topic_index.get_id(db, topic_name)
     
-    if not topic:
+    if topic_id is None:
         raise HTTPException(status_code=404, detail="Topic not found")
 
-    # Fetch questions for the topic
-    questions = db.query(models.Question).filter(models.Question.topic_id == topic.id).all()
-    
+    # Only the columns the response needs, keyset on id
+    stmt = (
+        select(models.Question.id, models.Question.question, models.Question.options, models.Question.correct)
+        .where(models.Question.topic_id == topic_id, models.Question.id > after_id)
+        .order_by(models.Question.id)
+    )
+
+    if stream:
+        return StreamingResponse(
+            stream_ndjson(stmt, lambda row: quiz_item(row, topic_name)),
+            media_type="application/x-ndjson",
+        )
+
+    rows, headers = keyset_page((await db.execute(stmt.limit(limit + 1))).all(), limit)
+
     # Prepare the response in the expected format
-    quiz_data = [
-        {
-            "question": question.question,
-            "options": json.loads(question.options),  # Convert options back to a list
-            "correct": question.correct,
-            "topic": topic.name
-        }
-        for question in questions
-    ]
+    quiz_data = [quiz_item(row, topic_name) for row in rows]
 
-    return {"quiz": quiz_data}
+    # The rows are plain JSON already, so skip FastAPI's jsonable_encoder pass
+    return ORJSONResponse({"quiz": quiz_data}, headers=headers)
 
 
 @router.post("/generate-quiz/")
-def generate_quiz(db: Session = Depends(get_db),
-             current_user: models.User = Depends(get_current_user)
+async def generate_quiz(db: AsyncSession = Depends(get_db),
+             current_user: CurrentUser = Depends(get_current_user)
              ):
-    user_id = current_user.id
-    # Fetch user preferences from the database
-    preferences = db.query(models.UserPreference).filter(models.UserPreference.user_id == user_id).first()
+    quiz_data = await build_quiz(db, current_user.id)
+
+    return {"quiz": quiz_data}
+
+# Same as generate-quiz, but streams each question as a Server-Sent Event as soon as it is ready
+@router.post("/generate-quiz/stream")
+async def generate_quiz_stream(db: AsyncSession = Depends(get_db),
+                               current_user: CurrentUser = Depends(get_current_user)):
+    preferences, topics = await get_quiz_preferences(db, current_user.id)
+    quiz_preferences = schemas.QuizPreferences(
+        difficulty_level=preferences.difficulty_level, quiz_format=preferences.quiz_format
+    )
+
+    return StreamingResponse(
+        stream_quiz(current_user.id, quiz_preferences, topics),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Queue a quiz generation and return right away; poll the job for the result
+@router.post("/generate-quiz/jobs", response_model=schemas.QuizJobResponse, status_code=202)
+async def submit_quiz_job(db: AsyncSession = Depends(get_db),
+                          current_user: CurrentUser = Depends(get_current_user)):
+    preferences = await db.scalar(select(models.UserPreference).where(models.UserPreference.user_id == current_user.id))
     if not preferences:
         raise HTTPException(status_code=404, detail="User preferences not found")
-    
-    # Fetch topics selected by the user by joining UserTopic and Topic tables
-    topics = db.query(models.Topic.name).join(models.UserTopic).filter(models.UserTopic.user_id == user_id).all()
-    
-    if not topics:
-        raise HTTPException(status_code=404, detail="User topics not found")
 
-    # Convert fetched topics from list of tuples to a list of strings
-    topics = [topic[0] for topic in topics]
-    
+    job = await jobs.submit_job(db, current_user.id)
+    return jobs.job_response(job)
 
-    # Generate quiz using OpenAI LLM through LangChain
-    quiz_output = generate_quiz_with_langchain(preferences, topics)
-
-    # Extract quiz questions from the Pydantic model
-    quiz_data = quiz_output.root  # Access the root attribute
-
-    for item in quiz_data:
-        topic_name = item.topic  # Access topic directly
-        topic = db.query(models.Topic).filter_by(name=topic_name).first()
-        if not topic:
-            topic = models.Topic(name=topic_name)
-            db.add(topic)
-            db.commit()
-            db.refresh(topic)
-
-        question = models.Question(
-            topic_id=topic.id,
-            question=item.question,  # Access question text directly
-            options=json.dumps(item.options),  # Store options as JSON string
-            correct=item.correct  # Access correct answer directly
-        )
-        db.add(question)
+@router.get("/generate-quiz/jobs/{job_id}", response_model=schemas.QuizJobResponse)
+async def get_quiz_job(job_id: str, db: AsyncSession = Depends(get_read_db),
+                       current_user: CurrentUser = Depends(get_current_user)):
+    job = await db.scalar(select(models.QuizJob).where(models.QuizJob.id == job_id, models.QuizJob.user_id == current_user.id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-    db.commit()
+    return jobs.job_response(job)
 
-    
+@router.get("/quiz-cache")
+def get_quiz_cache_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return quiz_cache.stats()
 
-    return {"quiz": quiz_output}
+@router.delete("/quiz-cache")
+async def invalidate_quiz_cache(db: AsyncSession = Depends(get_db), admin: CurrentUser = Depends(get_admin_user)):
+    await quiz_cache.invalidate(db)
+    await db.commit()
+    return {"message": "Quiz cache cleared"}
 
 @router.put("/track_performance", response_model=schemas.UserPerformanceResponse)
-def track_user_performance(
+async def track_user_performance(
     input_data: list[schemas.UserPerformanceCreate],  # Assuming input schema
-    db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db), 
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     user_id = current_user.id  # Extracted from bearer token
 
     total_questions = len(input_data)
-    correct_count = 0
-    incorrect_count = 0
-
-    for data in input_data:
-        topic_name = data.topic
-        is_correct = data.is_correct
-
-        # Find the topic in the database
-        topic = db.query(models.Topic).filter(models.Topic.name == topic_name).first()
-        if not topic:
-            raise HTTPException(status_code=404, detail=f"Topic {topic_name} not found")
-
-        # Find the user's performance for this topic
-        performance = db.query(models.UserPerformance).filter(
-            models.UserPerformance.user_id == user_id,
-            models.UserPerformance.topic_id == topic.id
-        ).first()
-
-        # If no performance entry exists, create one
-        if not performance:
-            performance = models.UserPerformance(
-                user_id=user_id,
-                topic_id=topic.id,
-                correct_count=0,
-                incorrect_count=0
-            )
-            db.add(performance)
-            db.commit()
-            db.refresh(performance)
-
-        # Update performance based on is_correct value
-        if is_correct == 'true':
-            performance.correct_count += 1
-            correct_count += 1  # Count correct for this session
-        else:
-            performance.incorrect_count += 1
-            incorrect_count += 1  # Count incorrect for this session
-
-        db.commit()
+
+    # Log the answers and update the aggregates in one transaction
+    correct_count, incorrect_count = await performance.record_attempts(db, user_id, input_data)
+    await db.commit()
 
     # Calculate the performance percentage for this session
     percentage = (correct_count / total_questions) * 100 if total_questions > 0 else 0
@@ -405,23 +267,19 @@ def track_user_performance(
         "percentage": percentage
     }
 
-def generate_tavily_prompt(topic_name: str) -> str:
-    """
-    Generates a Tavily search prompt based on the topic name.
-    """
-    return f"Find top learning resources for {topic_name}. The resources should include tutorials, articles, videos, and courses that help improve understanding and skills in {topic_name}. Focus on beginner to intermediate level materials, emphasizing practical examples and hands-on learning."
-
 @router.get("/recommend_resources")
-def recommend_resources_for_user(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def recommend_resources_for_user(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     user_id = current_user.id
 
-    # Fetch the user's performance on all topics
-    user_performances = db.query(models.UserPerformance).filter(
-        models.UserPerformance.user_id == user_id
-    ).all()
+    # Read the user's precomputed per-topic counters along with the topic names
+    user_performances = (await db.execute(
+        select(models.UserPerformance.correct_count, models.UserPerformance.incorrect_count, models.Topic)
+        .join(models.Topic, models.Topic.id == models.UserPerformance.topic_id)
+        .where(models.UserPerformance.user_id == user_id)
+    )).all()
 
     if not user_performances:
         raise HTTPException(status_code=404, detail="No performance data found for the user")
@@ -431,15 +289,15 @@ def recommend_resources_for_user(
     weak_topics = []
 
     # Calculate overall performance and identify weak topics
-    for performance in user_performances:
-        total_correct += performance.correct_count
-        total_incorrect += performance.incorrect_count
-        total_attempts = performance.correct_count + performance.incorrect_count
+    for correct, incorrect, topic in user_performances:
+        total_correct += correct
+        total_incorrect += incorrect
+        total_attempts = correct + incorrect
 
         if total_attempts > 0:
-            topic_accuracy = (performance.correct_count / total_attempts) * 100
+            topic_accuracy = (correct / total_attempts) * 100
             if topic_accuracy < 90:  # Weak topic if accuracy is below 90%
-                weak_topics.append(performance.topic_id)
+                weak_topics.append(topic)
 
     # Overall accuracy
     total_attempts = total_correct + total_incorrect
@@ -447,92 +305,132 @@ def recommend_resources_for_user(
 
     # If the overall performance is below 90%, recommend resources
     if overall_accuracy < 90:
-        resources = []
-
-        for topic_id in weak_topics:
-            topic = db.query(models.Topic).filter(models.Topic.id == topic_id).first()
-
-            if topic:
-                # Generate Tavily search prompt for the topic
-                search_prompt = generate_tavily_prompt(topic.name)
-
-                # Use Tavily API to search for resources related to the topic
-                tool = TavilySearchResults(
-                    max_results=5,
-                    search_depth="advanced",
-                    include_answer=True,
-                    include_raw_content=True,
-                    include_images=True,
-                )
-
-                response_tavily = tool.invoke({"query": search_prompt})
-                resources.append(
-                    {
-                        "topic": topic.name,
-                        "resources": response_tavily
-                    }
-                )
-
-        return {"overall_accuracy": overall_accuracy, "resources": resources}
+        # Resources are fetched ahead of time by the background refresher
+        stored = await resources.load_topic_resources(db, [topic.id for topic in weak_topics])
+        if len(stored) < len(weak_topics):
+            resources.request_refresh()
+
+        topic_resources = [
+            {"topic": topic.name, "resources": stored.get(topic.id, [])}
+            for topic in weak_topics
+        ]
+
+        return {"overall_accuracy": overall_accuracy, "resources": topic_resources}
 
     return {"overall_accuracy": overall_accuracy, "resources": []}
 
 @router.get("/user_performance", response_model=schemas.UserOverallPerformanceResponse)
-def get_user_performance(
-    db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_user)
+async def get_user_performance(
+    db: AsyncSession = Depends(get_read_db), 
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     user_id = current_user.id  # Extracted from bearer token
 
-    # Query the UserPerformance table to get the user's performance on all topics
-    user_performance = db.query(models.UserPerformance).filter(models.UserPerformance.user_id == user_id).all()
+    # One joined query for every topic, with the percentage computed in SQL
+    attempts = models.UserPerformance.correct_count + models.UserPerformance.incorrect_count
+    rows = (await db.execute(
+        select(
+            models.Topic.name,
+            models.UserPerformance.correct_count,
+            models.UserPerformance.incorrect_count,
+            case((attempts > 0, models.UserPerformance.correct_count * 100.0 / attempts), else_=0).label("percentage"),
+        )
+        .join(models.Topic, models.Topic.id == models.UserPerformance.topic_id)
+        .where(models.UserPerformance.user_id == user_id)
+        .order_by(models.UserPerformance.id)
+    )).all()
 
-    if not user_performance:
+    if not rows:
         raise HTTPException(status_code=404, detail="No performance data found for the user")
 
-    # Create a list to hold performance results for each topic
-    overall_performance = []
-
-    # Loop through each topic performance and calculate the percentage
-    for performance in user_performance:
-        topic = db.query(models.Topic).filter(models.Topic.id == performance.topic_id).first()
-        if topic:
-            total_attempts = performance.correct_count + performance.incorrect_count
-            percentage = (performance.correct_count / total_attempts * 100) if total_attempts > 0 else 0
-            
-            overall_performance.append({
-                "topic": topic.name,
-                "correct_count": performance.correct_count,
-                "incorrect_count": performance.incorrect_count,
-                "percentage": percentage
-            })
+    overall_performance = [
+        {
+            "topic": topic_name,
+            "correct_count": correct_count,
+            "incorrect_count": incorrect_count,
+            "percentage": percentage
+        }
+        for topic_name, correct_count, incorrect_count, percentage in rows
+    ]
 
     # Return the overall performance
     return {"user_id": user_id, "overall_performance": overall_performance}
 
-@router.get("/gettopics")
-def get_all_topics(db: Session = Depends(get_db)):
-    topics = db.query(models.Topic).all()
-    return topics
+# Accuracy per day, read from the precomputed daily aggregates
+@router.get("/user_performance/history", response_model=schemas.UserPerformanceHistoryResponse)
+async def get_user_performance_history(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    days = await db.scalars(
+        select(models.UserDailyPerformance)
+        .where(models.UserDailyPerformance.user_id == current_user.id)
+        .order_by(models.UserDailyPerformance.day)
+    )
+
+    history = []
+    for day in days:
+        total_attempts = day.correct_count + day.incorrect_count
+        history.append({
+            "day": day.day,
+            "correct_count": day.correct_count,
+            "incorrect_count": day.incorrect_count,
+            "percentage": (day.correct_count / total_attempts * 100) if total_attempts > 0 else 0
+        })
+
+    return {"user_id": current_user.id, "history": history}
+
+# Paginated like quiz-by-topic
+@router.get("/gettopics", response_model=List[schemas.TopicResponse])
+async def get_all_topics(response: Response,
+                         after_id: int = Query(0, ge=0),
+                         limit: int = Query(settings.page_size_default, ge=1, le=settings.page_size_max),
+                         stream: bool = False,
+                         db: AsyncSession = Depends(get_read_db)):
+    stmt = select(models.Topic.id, models.Topic.name).where(models.Topic.id > after_id).order_by(models.Topic.id)
+
+    if stream:
+        return StreamingResponse(
+            stream_ndjson(stmt, lambda row: {"id": row.id, "name": row.name}),
+            media_type="application/x-ndjson",
+        )
+
+    rows, headers = keyset_page((await db.execute(stmt.limit(limit + 1))).all(), limit)
+    response.headers.update(headers)
+    return [{"id": row.id, "name": row.name} for row in rows]
 
 @router.get("/profile", response_model=schemas.UserProfileResponse)
-def get_user_profile(
-    db: Session = Depends(get_db), 
-    current_user: models.User = Depends(get_current_user)
+async def get_user_profile(
+    db: AsyncSession = Depends(get_read_db), 
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     user_id = current_user.id  # Extracted from bearer token
 
-    # Fetch user information
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
+    # Fetch the user together with their topics in one query; users without topics get a single row
+    rows = (await db.execute(
+        select(
+            models.User.first_name,
+            models.User.last_name,
+            models.User.email,
+            models.User.address,
+            models.User.phone_number,
+            models.User.education,
+            models.Topic.id.label("topic_id"),
+            models.Topic.name.label("topic_name"),
+        )
+        .outerjoin(models.UserTopic, models.UserTopic.user_id == models.User.id)
+        .outerjoin(models.Topic, models.Topic.id == models.UserTopic.topic_id)
+        .where(models.User.id == user_id)
+        .order_by(models.UserTopic.id)
+    )).all()
+    if not rows:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Fetch user topics
-    user_topics = db.query(models.UserTopic).filter(models.UserTopic.user_id == user_id).all()
-    topics = [db.query(models.Topic).filter(models.Topic.id == ut.topic_id).first() for ut in user_topics]
-
     # Prepare the response
-    selected_topics = [schemas.UserTopicResponse(id=topic.id, name=topic.name) for topic in topics if topic]
+    user = rows[0]
+    selected_topics = [
+        schemas.UserTopicResponse(id=row.topic_id, name=row.topic_name) for row in rows if row.topic_id is not None
+    ]
 
     return schemas.UserProfileResponse(
         first_name=user.first_name,
@@ -543,4 +441,3 @@ def get_user_profile(
         education=user.education,
         selected_topics=selected_topics
     )
-
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, RootModel
 from typing import List, Optional
+from datetime import date
 
 # Topic schemas
 class TopicCreate(BaseModel):
@@ -9,8 +10,7 @@ class TopicResponse(BaseModel):
     id: int
     name: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # User Preference schemas
 class UserPreferenceCreate(BaseModel):
@@ -25,13 +25,13 @@ class UserPreferenceResponse(BaseModel):
     quiz_format: str
     topics: List[TopicResponse]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class UserPerformanceCreate(BaseModel):
     topic: str
     is_correct: str  # You might want to use a boolean here for easier processing
+    question_id: Optional[int] = None  # id of the answered question, as returned with the quiz
 
 class UserPerformanceResponse(BaseModel):
     total_questions: int
@@ -39,8 +39,7 @@ class UserPerformanceResponse(BaseModel):
     incorrect_count: int
     percentage: float
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class UserTopicPerformance(BaseModel):
     topic: str
@@ -48,15 +47,23 @@ class UserTopicPerformance(BaseModel):
     incorrect_count: int
     percentage: float
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class UserOverallPerformanceResponse(BaseModel):
     user_id: int
     overall_performance: List[UserTopicPerformance]
 
-    class Config:
-        orm_mode = True        
+    model_config = ConfigDict(from_attributes=True)
+
+class UserDailyPerformance(BaseModel):
+    day: date
+    correct_count: int
+    incorrect_count: int
+    percentage: float
+
+class UserPerformanceHistoryResponse(BaseModel):
+    user_id: int
+    history: List[UserDailyPerformance]
 
 class UserTopicResponse(BaseModel):
     id: int
@@ -71,5 +78,28 @@ class UserProfileResponse(BaseModel):
     education: str
     selected_topics: List[UserTopicResponse]
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+# Quiz schemas
+class QuizPreferences(BaseModel):
+    difficulty_level: str
+    quiz_format: str
+
+class QuizQuestion(BaseModel):
+    question: str
+    options: list[str]
+    correct: str
+    topic : str
+
+class Quiz(RootModel):
+    root: list[QuizQuestion]
+
+# A question as served to a user, with its id in the question bank
+class ServedQuizQuestion(QuizQuestion):
+    id: int
+
+class QuizJobResponse(BaseModel):
+    job_id: str
+    status: str
+    quiz: Optional[List[ServedQuizQuestion]] = None
+    error: Optional[str] = None
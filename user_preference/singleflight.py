@@ -0,0 +1,115 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import delete, update
+from database import AsyncSessionLocal
+from user_preference import models
+from config import settings
+
+# Identifies this process in generation_locks and quiz_jobs. Unique per process
+# start, so a restarted process with the same pid doesn't mistake the locks and
+# jobs of its predecessor for its own
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def try_acquire_lock(key: str, ttl: int = None) -> bool:
+    """Takes the generation_locks row for `key`, clearing it first if its holder let it expire."""
+    now = datetime.utcnow()
+    ttl = ttl or settings.singleflight_lock_ttl
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(models.GenerationLock).where(
+            models.GenerationLock.key == key,
+            models.GenerationLock.expires_at < now,
+        ))
+        db.add(models.GenerationLock(
+            key=key,
+            owner=OWNER,
+            expires_at=now + timedelta(seconds=ttl),
+        ))
+        try:
+            await db.commit()
+            return True
+        except IntegrityError:
+            await db.rollback()
+            return False
+
+
+async def renew_lock(key: str, ttl: int) -> bool:
+    """Extends the lock if this process still holds it."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(models.GenerationLock)
+            .where(models.GenerationLock.key == key, models.GenerationLock.owner == OWNER)
+            .values(expires_at=datetime.utcnow() + timedelta(seconds=ttl))
+        )
+        await db.commit()
+        return result.rowcount > 0
+
+
+async def release_lock(key: str):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(models.GenerationLock).where(
+            models.GenerationLock.key == key,
+            models.GenerationLock.owner == OWNER,
+        ))
+        await db.commit()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller starts the
+    work, later callers wait on the same task and get its result or its error.
+
+    With cross_worker enabled the task also takes a row lock in the
+    generation_locks table. While another worker holds it, the task polls
+    `recheck` (e.g. a lookup in the shared quiz_cache table) and returns that
+    result once it shows up, falling back to doing the work itself when the
+    lock is released without a result or expires. Callers that store the
+    result themselves do so just after the lock is released, so a waiter
+    taking the lock in that moment still repeats the work: the lock makes
+    duplicate generations rare rather than impossible.
+    """
+
+    def __init__(self, cross_worker: bool = False):
+        self.cross_worker = cross_worker
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn, recheck=None):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn, recheck))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: a caller going away must not cancel the work others wait on
+        return await asyncio.shield(task)
+
+    async def _run(self, key, fn, recheck):
+        if not self.cross_worker:
+            return await fn()
+
+        deadline = time.monotonic() + settings.singleflight_lock_ttl
+        while not await try_acquire_lock(key):
+            await asyncio.sleep(settings.singleflight_poll_interval)
+            if recheck is not None:
+                result = await recheck()
+                if result is not None:
+                    return result
+            if time.monotonic() > deadline:
+                break
+
+        try:
+            # The other worker may have finished between our last check and the lock
+            if recheck is not None:
+                result = await recheck()
+                if result is not None:
+                    return result
+            return await fn()
+        finally:
+            await release_lock(key)
+
+
+quiz_flights = SingleFlight(cross_worker=settings.singleflight_cross_worker)
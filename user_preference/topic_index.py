@@ -0,0 +1,98 @@
+import threading
+import time
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from user_preference import models
+from config import settings
+
+GENERATION_KEY = "topics"
+
+
+class TopicIndex:
+    """
+    Process-wide map of topic names to ids, loaded from the topics table on
+    first use. Topics are never renamed or deleted, so a stale index can only
+    be missing entries: names it doesn't know are looked up in the database
+    and added. Every change to topics also bumps a counter in
+    index_generations; at most every topic_index_check_interval seconds the
+    index compares it with the generation it loaded and reloads if another
+    worker changed the table.
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._by_name: dict[str, int] = {}
+        self._generation = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    async def resolve(self, db: AsyncSession, names) -> dict[str, int]:
+        """Maps the given names to topic ids; unknown topics are left out."""
+        await self._refresh_if_stale(db)
+        with self._lock:
+            found = {name: self._by_name[name] for name in names if name in self._by_name}
+
+        missing = set(names) - found.keys()
+        if missing:
+            rows = dict((await db.execute(
+                select(models.Topic.name, models.Topic.id).where(models.Topic.name.in_(missing))
+            )).all())
+            self.add(rows)
+            found.update(rows)
+        return found
+
+    async def get_id(self, db: AsyncSession, name: str):
+        return (await self.resolve(db, [name])).get(name)
+
+    def add(self, topics: dict[str, int]):
+        if topics:
+            with self._lock:
+                self._by_name.update(topics)
+
+    async def _refresh_if_stale(self, db: AsyncSession):
+        now = time.monotonic()
+        with self._lock:
+            if self._generation is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            loaded_generation = self._generation
+
+        generation = await db.scalar(
+            select(models.IndexGeneration.generation).where(models.IndexGeneration.name == GENERATION_KEY)
+        ) or 0
+        if generation == loaded_generation:
+            return
+
+        by_name = dict((await db.execute(select(models.Topic.name, models.Topic.id))).all())
+        with self._lock:
+            self._by_name = by_name
+            self._generation = generation
+
+
+topic_index = TopicIndex(check_interval=settings.topic_index_check_interval)
+
+
+async def bump_generation(db: AsyncSession):
+    """Marks the topics table as changed; runs in the caller's transaction."""
+    stmt = insert(models.IndexGeneration).values(name=GENERATION_KEY, generation=1)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"generation": models.IndexGeneration.generation + 1},
+    ))
+
+
+def remember_new_topics(db: AsyncSession, topics: dict[str, int]):
+    """Queues topics created in this transaction; they join the index once it commits."""
+    db.info.setdefault("new_topics", {}).update(topics)
+
+
+@event.listens_for(Session, "after_commit")
+def publish_new_topics(session):
+    topic_index.add(session.info.pop("new_topics", None))
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_new_topics(session):
+    session.info.pop("new_topics", None)